@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from ecommerce_backend.tiered_cache import TieredCache
+
+users = TieredCache(
+    'auth_user', settings.AUTH_USER_CACHE_TTL,
+    max_size=settings.AUTH_USER_CACHE_SIZE, local_ttl=settings.AUTH_USER_CACHE_LOCAL_TTL,
+)
+
+
+def user_cache_key(user_id):
+    return f'auth_user_{user_id}'
+
+
+def _cached_fields():
+    # The password hash stays out of the cache; it is loaded on demand as a
+    # deferred field (e.g. by change_password_view) unless revocation needs it.
+    fields = [field.attname for field in get_user_model()._meta.concrete_fields]
+    if not api_settings.CHECK_REVOKE_TOKEN:
+        fields.remove('password')
+    return fields
+
+
+def get_user_row(user_id):
+    """
+    Column values for ``user_id`` from the two-tier cache, then the
+    database. Returns ``(fields, values)`` or ``None`` if there is no such user.
+    """
+    key = user_cache_key(user_id)
+    generation = users.generation
+    row = users.get(key)
+    if row is not None:
+        return row
+
+    fields = _cached_fields()
+    # Always from the primary: a row read from a lagging replica would go
+    # into the shared cache after the change's invalidation has run
+    values = (
+        get_user_model().objects.using(DEFAULT_DB_ALIAS)
+        .filter(**{api_settings.USER_ID_FIELD: user_id})
+        .values_list(*fields)
+        .first()
+    )
+    if values is None:
+        return None
+
+    row = (tuple(fields), values)
+    users.fill(key, row, generation)
+    return row
+
+
+def invalidate_user(user_id):
+    users.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that builds ``request.user`` from cached column
+    values instead of running ``SELECT ... FROM users`` on every request.
+
+    Every request gets its own ``User`` instance, so views can modify and
+    save ``request.user`` as before; saving invalidates the cached row.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        row = get_user_row(user_id)
+        if row is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        fields, values = row
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, fields, values)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
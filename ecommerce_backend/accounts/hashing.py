@@ -0,0 +1,122 @@
+import asyncio
+import inspect
+import threading
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import _clean_credentials, _get_backends, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.exceptions import PermissionDenied
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-in requests right now. Please retry shortly.'
+    default_code = 'hashing_pool_saturated'
+
+    def __init__(self):
+        super().__init__()
+        self.wait = settings.PASSWORD_HASHING_RETRY_AFTER
+
+
+class HashingPool:
+    """
+    Bounded thread pool for password hashing.
+
+    At most ``workers`` hashes run at once and at most ``max_pending`` more
+    wait for a thread; anything beyond that is refused immediately with
+    ``HashingPoolSaturated`` instead of queueing. Only pure hashing
+    functions belong here, never ORM calls, so the pool threads hold no
+    database connections.
+    """
+
+    def __init__(self, workers, max_pending):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated()
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+pool = HashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_MAX_PENDING)
+
+
+async def authenticate(request, username, password):
+    """
+    ``django.contrib.auth.authenticate`` for async views. Each backend in
+    ``AUTHENTICATION_BACKENDS`` is tried in turn: ``ModelBackend`` (and
+    subclasses keeping its ``authenticate``) hashes in the pool, any other
+    backend runs in a thread. ``user_login_failed`` is sent when none of
+    them accepts the credentials.
+    """
+    credentials = {'username': username, 'password': password}
+
+    for backend, backend_path in _get_backends(return_tuples=True):
+        try:
+            if type(backend).authenticate is ModelBackend.authenticate:
+                user = await _model_backend_authenticate(backend, username, password)
+            else:
+                try:
+                    inspect.signature(backend.authenticate).bind(request, **credentials)
+                except TypeError:
+                    # This backend doesn't accept these credentials
+                    continue
+                user = await sync_to_async(backend.authenticate)(request, **credentials)
+        except PermissionDenied:
+            # This backend says to stop in our tracks
+            break
+
+        if user is not None:
+            user.backend = backend_path
+            return user
+
+    await sync_to_async(user_login_failed.send)(
+        sender=__name__, credentials=_clean_credentials(credentials), request=request
+    )
+    return None
+
+
+async def _model_backend_authenticate(backend, username, password):
+    """
+    ``ModelBackend.authenticate`` with hashing in the pool: unknown
+    usernames still pay for one hash, and passwords stored with outdated
+    hasher parameters are upgraded.
+    """
+    User = get_user_model()
+    user = await User._default_manager.filter(**{User.USERNAME_FIELD: username}).afirst()
+
+    if user is None:
+        await pool.arun(make_password, password)
+        return None
+
+    if not await pool.arun(check_password, password, user.password):
+        return None
+
+    if not backend.user_can_authenticate(user):
+        return None
+
+    if identify_hasher(user.password).must_update(user.password):
+        user.password = await pool.arun(make_password, password)
+        await user.asave(update_fields=['password'])
+
+    return user
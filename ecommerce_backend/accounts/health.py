@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def check_database():
+    close_old_connections()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return {}
+
+
+def check_cache():
+    from ecommerce_backend.throttling import uses_redis
+
+    # Read-only: probes must not add write load to Redis
+    if uses_redis():
+        from django_redis import get_redis_connection
+        get_redis_connection('default').ping()
+    else:
+        cache.get('health_check')
+    return {}
+
+
+def check_broker():
+    """Broker reachability plus the number of waiting messages per queue."""
+    from celery import current_app
+
+    depths = {}
+    with current_app.connection_for_read() as conn:
+        conn.ensure_connection(max_retries=1)
+        channel = conn.default_channel
+
+        for name in current_app.amqp.queues:
+            try:
+                depths[name] = channel.queue_declare(queue=name, passive=True).message_count
+            except Exception:
+                # Not declared yet: nothing has been published to it
+                depths[name] = 0
+
+    return {'queues': depths}
+
+
+CHECKS = {
+    'database': check_database,
+    'cache': check_cache,
+    'broker': check_broker,
+}
+
+# The web process keeps working while the broker is down (tasks wait in the
+# outbox), so only these make an instance unready
+CRITICAL = ('database', 'cache')
+
+
+class HealthChecker:
+    """
+    Runs the dependency checks every ``HEALTH_CHECK_INTERVAL`` seconds on a
+    daemon thread and keeps the latest result, so readiness probes only read
+    a snapshot. Each check gets ``HEALTH_CHECK_TIMEOUT`` seconds; a check
+    that is still hanging from the previous round is not started again.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=len(CHECKS), thread_name_prefix='health-check')
+
+    def snapshot(self):
+        self._ensure_started()
+
+        if self._snapshot is None:
+            self.refresh()
+
+        snapshot = dict(self._snapshot)
+        age = time.monotonic() - snapshot.pop('_monotonic')
+        if age > settings.HEALTH_SNAPSHOT_MAX_AGE:
+            snapshot['status'] = 'unhealthy'
+            snapshot['stale'] = True
+        return snapshot
+
+    def refresh(self):
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        for name, check in CHECKS.items():
+            future = self._pending.get(name)
+            if future is None or future.done():
+                self._pending[name] = self._executor.submit(check)
+
+        deadline = time.monotonic() + settings.HEALTH_CHECK_TIMEOUT
+        snapshot = {'status': 'healthy'}
+
+        for name, future in self._pending.items():
+            try:
+                details = future.result(timeout=max(0, deadline - time.monotonic()))
+                snapshot[name] = 'up'
+                snapshot.update(details)
+            except TimeoutError:
+                snapshot[name] = 'timeout'
+            except Exception as e:
+                logger.error(f"{name.capitalize()} health check failed: {e}")
+                snapshot[name] = 'down'
+
+            if name in CRITICAL and snapshot[name] != 'up':
+                snapshot['status'] = 'unhealthy'
+
+        snapshot['checked_at'] = timezone.now().isoformat()
+        snapshot['_monotonic'] = time.monotonic()
+        self._snapshot = snapshot
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='health-checker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Health checker failed: {e}")
+            time.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+
+checker = HealthChecker()
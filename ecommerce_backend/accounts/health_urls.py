@@ -1,6 +1,8 @@
 from django.urls import path
-from .health_views import health_check
+from .health_views import health_check, liveness, readiness
 
 urlpatterns = [
     path('', health_check, name='health_check'),
-]
\ No newline at end of file
+    path('live/', liveness, name='health_live'),
+    path('ready/', readiness, name='health_ready'),
+]
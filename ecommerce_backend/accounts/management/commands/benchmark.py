@@ -0,0 +1,84 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from ecommerce_backend import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the API end to end against a freshly seeded test database. '
+        'Run with --settings=ecommerce_backend.benchmark_settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', choices=sorted(benchmark.SCENARIOS), action='append', help='Default: all scenarios'
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--orders-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark_results.json', help='Where to write the JSON results')
+        parser.add_argument('--baseline', help='Results file to compare against; regressions fail the command')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed p95 latency increase and throughput drop against the baseline (0.2 = 20%%)'
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK', False):
+            raise CommandError('Run with --settings=ecommerce_backend.benchmark_settings')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        dataset_options = {
+            name: options[name] for name in ('users', 'categories', 'products', 'orders_per_user', 'seed')
+        }
+        scenarios = options['scenario'] or list(benchmark.SCENARIOS)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f'Seeding {connection.vendor} database...')
+            dataset = benchmark.seed(**dataset_options)
+
+            results = {'environment': benchmark.environment(dataset_options), 'scenarios': {}}
+            self.stdout.write(
+                f"{'scenario':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+                f"{'queries':>9}{'errors':>8}"
+            )
+            for name in scenarios:
+                result = benchmark.run_scenario(name, dataset, options['requests'], options['warmup'], options['seed'])
+                results['scenarios'][name] = result
+                self.stdout.write(
+                    f"{name:<16}{result['throughput_rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                    f"{result['p99_ms']:>10}{result['queries_per_request']:>9}{result['errors']:>8}"
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        failures = [
+            f"{name}: {result['errors']} of {result['requests']} requests failed"
+            for name, result in results['scenarios'].items() if result['errors']
+        ]
+        if baseline is not None:
+            if baseline['environment'].get('dataset') != dataset_options:
+                self.stdout.write(self.style.WARNING('Baseline was recorded with a different dataset'))
+            failures += benchmark.compare(results, baseline, options['tolerance'])
+
+        if failures:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# (server, gunicorn worker class, catalog path it serves best)
+PROFILES = (
+    ('wsgi', 'sync', 'ecommerce_backend.wsgi:application', '/api/products/'),
+    ('asgi', 'uvicorn.workers.UvicornWorker', 'ecommerce_backend.asgi:application', '/api/catalog/products/'),
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def slow_client(port, path, trickle):
+    """
+    Send the request headers one line at a time over ``trickle`` seconds,
+    as a client on a slow mobile link would, then read the response.
+    Returns (status, seconds).
+    """
+    started = time.monotonic()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = [
+        f'GET {path} HTTP/1.1', 'Host: localhost', 'Accept: application/json',
+        'User-Agent: benchmark-concurrency', 'Connection: close',
+    ]
+    for line in lines:
+        writer.write(f'{line}\r\n'.encode())
+        await writer.drain()
+        await asyncio.sleep(trickle / len(lines))
+    writer.write(b'\r\n')
+    await writer.drain()
+
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1]), time.monotonic() - started
+
+
+async def run_clients(port, path, clients, trickle, timeout):
+    tasks = [asyncio.wait_for(slow_client(port, path, trickle), timeout) for _ in range(clients)]
+    started = time.monotonic()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    return results, time.monotonic() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Start gunicorn with the sync WSGI and the uvicorn ASGI profiles and report how many concurrent '
+        'slow clients one worker serves while its queries wait on the database. Uses the configured database, so seed it first '
+        '(generate_dataset); run with --settings=ecommerce_backend.benchmark_settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20, help='Concurrent connections')
+        parser.add_argument('--trickle', type=float, default=0.5, help='Seconds each client takes to send its headers')
+        parser.add_argument(
+            '--db-latency', type=float, default=0.02,
+            help='Seconds added to every query, as a network round trip to the database would'
+        )
+        parser.add_argument('--timeout', type=float, default=60.0, help='Give up on a client after this many seconds')
+        parser.add_argument('--workers', type=int, default=1, help='Gunicorn workers per profile')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BENCHMARK', False):
+            raise CommandError('Run with --settings=ecommerce_backend.benchmark_settings')
+
+        self.stdout.write(
+            f"{options['clients']} clients, {options['trickle']}s to send headers, "
+            f"{options['db_latency'] * 1000:.0f} ms per query, {options['workers']} worker(s)"
+        )
+        self.stdout.write(
+            f"{'profile':<8}{'ok':>5}{'failed':>8}{'wall s':>9}{'p50 s':>8}{'p95 s':>8}{'concurrency':>13}"
+        )
+        for profile in PROFILES:
+            self.run_profile(*profile, options)
+
+    def run_profile(self, name, worker_class, app, path, options):
+        port = free_port()
+        env = {
+            **os.environ,
+            'BENCHMARK_DB_LATENCY': str(options['db_latency']),
+            'PROMETHEUS_MULTIPROC_DIR': tempfile.mkdtemp(prefix='benchmark-metrics-'),
+        }
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', app, '-c', 'gunicorn.conf.py', '-k', worker_class,
+                '--workers', str(options['workers']), '--bind', f'127.0.0.1:{port}',
+                '--timeout', str(int(options['timeout'])), '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR, env=env,
+        )
+
+        try:
+            self.wait_until_serving(port, path)
+            results, wall = asyncio.run(
+                run_clients(port, path, options['clients'], options['trickle'], options['timeout'])
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies = sorted(
+            result[1] for result in results if not isinstance(result, BaseException) and result[0] == 200
+        )
+        failed = len(results) - len(latencies)
+        if not latencies:
+            self.stdout.write(f'{name:<8}{0:>5}{failed:>8}{wall:>9.2f}')
+            return
+
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        # How many requests were in flight on average while the batch ran
+        concurrency = sum(latencies) / wall
+        self.stdout.write(
+            f'{name:<8}{len(latencies):>5}{failed:>8}{wall:>9.2f}{statistics.median(latencies):>8.2f}'
+            f'{p95:>8.2f}{concurrency:>13.1f}'
+        )
+
+    def wait_until_serving(self, port, path, attempts=100):
+        for _ in range(attempts):
+            try:
+                status, _ = asyncio.run(slow_client(port, path, 0))
+                if status == 200:
+                    return
+                raise CommandError(f'{path} returned {status}; is the database seeded and migrated?')
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError('Server did not start')
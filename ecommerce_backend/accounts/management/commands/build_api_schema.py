@@ -0,0 +1,19 @@
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Write the OpenAPI schema served at /swagger.json to API_SCHEMA_PATH'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.API_SCHEMA_PATH, help='Where to write the schema')
+
+    def handle(self, *args, **options):
+        from ecommerce_backend.docs import build_schema
+
+        path = Path(options['output'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = build_schema()
+        path.write_bytes(content)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(content)} bytes of OpenAPI schema to {path}'))
@@ -0,0 +1,70 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from accounts.models import User
+from ecommerce_backend import datagen
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users, categories, products, carts and orders at production scale. '
+        'The same seed and batch size always produce the same data.'
+    )
+
+    def add_arguments(self, parser):
+        defaults = datagen.defaults()
+
+        parser.add_argument('--users', type=int, default=defaults['users'])
+        parser.add_argument('--categories', type=int, default=defaults['categories'])
+        parser.add_argument('--products', type=int, default=defaults['products'])
+        parser.add_argument('--orders', type=int, default=defaults['orders'])
+        parser.add_argument(
+            '--cart-ratio', type=float, default=defaults['cart_ratio'], help='Share of users with an open cart'
+        )
+        parser.add_argument('--items-per-order', type=float, default=defaults['items_per_order'], help='Mean')
+        parser.add_argument('--items-per-cart', type=float, default=defaults['items_per_cart'], help='Mean')
+        parser.add_argument(
+            '--product-skew', type=float, default=defaults['product_skew'],
+            help='Zipf exponent of product popularity; 0 for uniform'
+        )
+        parser.add_argument(
+            '--customer-skew', type=float, default=defaults['customer_skew'],
+            help='Zipf exponent of orders per customer; 0 for uniform'
+        )
+        parser.add_argument('--days', type=int, default=defaults['days'], help='Spread creation times over this many days')
+        parser.add_argument('--seed', type=int, default=defaults['seed'])
+        parser.add_argument('--batch-size', type=int, default=defaults['batch_size'])
+        parser.add_argument('--workers', type=int, default=1, help='Processes per phase (PostgreSQL only)')
+        parser.add_argument(
+            '--prefix', default=defaults['prefix'],
+            help='Prefix of generated usernames, category and product slugs; must not be in use yet'
+        )
+        parser.add_argument('--password', help='Password for every generated user (default: unusable)')
+
+    def handle(self, *args, **options):
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            raise CommandError('SQLite allows one writer at a time; use --workers 1')
+        if options['categories'] < 1 or options['products'] < 1:
+            raise CommandError('At least one category and one product are required')
+        prefix = f"{options['prefix']}-"
+        if User.objects.filter(username__startswith=prefix).exists() or \
+                Product.objects.filter(slug__startswith=prefix).exists():
+            raise CommandError(f"Data with prefix '{options['prefix']}' already exists; pick another --prefix")
+
+        generation = datagen.defaults(**{
+            name: options[name] for name in datagen.defaults() if name != 'password'
+        })
+        if options['password']:
+            generation['password'] = make_password(options['password'])
+
+        datagen.generate(generation, workers=options['workers'], progress=self.progress)
+        self.stdout.write(self.style.SUCCESS(
+            'Done. Run rebuild_sales_rollups --days '
+            f"{options['days'] + 1} --include-current to build the sales dashboard rollups "
+            '(before orders are placed: it replaces the live counters of the current hour and day).'
+        ))
+
+    def progress(self, phase, rows, seconds):
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(f'{phase:<12}{rows:>12,} rows in {seconds:8.1f}s ({rate:,.0f} rows/s)')
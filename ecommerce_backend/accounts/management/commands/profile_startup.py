@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What each process imports before it can serve its first request or task
+TARGETS = {
+    'wsgi': (
+        'import ecommerce_backend.wsgi; '
+        'from django.urls import get_resolver; get_resolver().url_patterns'
+    ),
+    'celery': (
+        'import django; from ecommerce_backend.celery import app; '
+        'django.setup(); app.loader.import_default_modules()'
+    ),
+}
+
+
+def profile(code, env):
+    """Run ``code`` under ``python -X importtime``; return (total µs, µs per top-level package)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode:
+        raise CommandError(result.stderr.strip().splitlines()[-1])
+
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, _, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+
+    return sum(packages.values()), packages
+
+
+class Command(BaseCommand):
+    help = 'Report import-time cost of starting the WSGI app and a Celery worker, with docs on and off'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), action='append', help='Default: all targets')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per configuration; the median is reported')
+        parser.add_argument('--top', type=int, default=10, help='Packages to list per configuration')
+
+    def handle(self, *args, **options):
+        for target in options['target'] or sorted(TARGETS):
+            results = {}
+
+            for docs_enabled in ('True', 'False'):
+                env = {**os.environ, 'API_DOCS_ENABLED': docs_enabled}
+                runs = sorted(
+                    (profile(TARGETS[target], env) for _ in range(options['repeat'])),
+                    key=lambda run: run[0]
+                )
+                total, packages = runs[len(runs) // 2]
+                results[docs_enabled] = packages
+
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{target} (API_DOCS_ENABLED={docs_enabled}): median {total / 1000:.0f} ms, '
+                    f'fastest {runs[0][0] / 1000:.0f} ms over {len(runs)} runs'
+                ))
+                top = sorted(packages.items(), key=lambda item: -item[1])[:options['top']]
+                for name, self_us in top:
+                    self.stdout.write(f'  {self_us / 1000:8.1f} ms  {name}')
+
+            docs_only = {
+                name: self_us for name, self_us in results['True'].items()
+                if name not in results['False']
+            }
+            self.stdout.write(
+                f'{target}: {sum(docs_only.values()) / 1000:.1f} ms in packages only imported with docs enabled '
+                f'({", ".join(sorted(docs_only)) or "none"})\n'
+            )
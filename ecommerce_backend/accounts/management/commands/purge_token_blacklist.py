@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from accounts import tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete OutstandingToken/BlacklistedToken rows in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.JWT_TOKEN_PURGE_BATCH_SIZE)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Also delete unexpired tokens, after copying blacklisted ones into Redis '
+                 '(requires JWT_BLACKLIST_BACKEND=redis)'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            if settings.JWT_BLACKLIST_BACKEND != 'redis':
+                raise CommandError('--all would drop the live blacklist unless JWT_BLACKLIST_BACKEND is redis')
+
+            imported = tokens.import_blacklist(options['batch_size'])
+            self.stdout.write(f'Copied {imported} blacklisted tokens into Redis')
+
+        purged = tokens.purge_token_tables(options['batch_size'], expired_only=not options['all'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} outstanding tokens'))
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from . import hashing
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -19,13 +23,21 @@ class UserSerializer(serializers.ModelSerializer):
         return value.lower()
 
     def create(self, validated_data):
-        user = User.objects.create_user(**validated_data)
-        return user
+        # signup_view hashes the password off the event loop and passes it in
+        encoded_password = validated_data.pop('encoded_password', None)
+        if encoded_password is None:
+            return User.objects.create_user(**validated_data)
+        
+        validated_data.pop('password')
+        # What create_user would have normalized
+        validated_data['username'] = User.normalize_username(validated_data['username'])
+        validated_data['email'] = User.objects.normalize_email(validated_data.get('email'))
+        return User.objects.create(password=encoded_password, **validated_data)
 
     def update(self, instance, validated_data):
         if 'password' in validated_data:
             password = validated_data.pop('password')
-            instance.set_password(password)
+            instance.password = hashing.pool.run(make_password, password)
         return super().update(instance, validated_data)
 
 class LoginSerializer(serializers.Serializer):
@@ -34,4 +46,7 @@ class LoginSerializer(serializers.Serializer):
 
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(required=True, write_only=True)
-    new_password = serializers.CharField(required=True, validators=[validate_password], write_only=True)
\ No newline at end of file
+    new_password = serializers.CharField(required=True, validators=[validate_password], write_only=True)
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    token_class = RefreshToken
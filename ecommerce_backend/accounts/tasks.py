@@ -0,0 +1,7 @@
+from celery import shared_task
+from .tokens import purge_token_tables
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def purge_expired_tokens():
+    return purge_token_tables()
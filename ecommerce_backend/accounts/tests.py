@@ -1,3 +1,383 @@
-from django.test import TestCase
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
+import redis
+from celery import current_app
+from django.conf import settings
+from django.contrib.auth.backends import BaseBackend
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from ecommerce_backend import replicas, throttling
+from .authentication import get_user_row, invalidate_user, user_cache_key, users
+from .models import User
+from . import tokens
+from .tokens import BloomFilter, RefreshToken, revoked_tokens
 
-# Create your tests here.
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def redis_available():
+    try:
+        return redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5).ping()
+    except redis.RedisError:
+        return False
+
+
+REDIS = redis_available()
+
+
+@override_settings(
+    CACHES=LOCAL_CACHES,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class AccountsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        users.forget_all()
+        self.user = User.objects.create_user('customer', 'customer@example.com', 'password')
+
+    def bearer_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+
+class CachedUserTests(AccountsTestCase):
+    def test_deactivated_user_is_rejected_once_committed(self):
+        client = self.bearer_client(self.user)
+        self.assertEqual(client.get('/api/accounts/profile/').status_code, 200)
+        active_row = get_user_row(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.is_active = False
+                self.user.save()
+                # A concurrent request still sees the committed row and caches it again
+                users.set(user_cache_key(self.user.pk), active_row)
+
+        self.assertIsNone(users.get(user_cache_key(self.user.pk)))
+        self.assertEqual(client.get('/api/accounts/profile/').status_code, 401)
+
+    def test_rolled_back_change_keeps_the_cached_row(self):
+        get_user_row(self.user.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.user.first_name = 'Changed'
+                    self.user.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        self.assertIsNotNone(users.get(user_cache_key(self.user.pk)))
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_added_values_are_always_found(self):
+        bloom = BloomFilter(1000, 0.01)
+        values = [uuid.uuid4().hex for _ in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+
+    def test_false_positives_stay_near_the_error_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for _ in range(1000):
+            bloom.add(uuid.uuid4().hex)
+
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
+
+@skipUnless(REDIS, 'needs a Redis server at REDIS_URL')
+@skipUnless(settings.JWT_BLACKLIST_BACKEND == 'redis', 'JWT_BLACKLIST_BACKEND is not redis')
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RevokedTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('customer', 'customer@example.com', 'password')
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        client = APIClient()
+
+        self.assertEqual(client.post('/api/accounts/token/refresh/', {'refresh': refresh}).status_code, 200)
+        self.assertEqual(client.post('/api/accounts/token/refresh/', {'refresh': refresh}).status_code, 401)
+
+    def test_revocation_is_seen_with_and_without_the_filter(self):
+        token = RefreshToken.for_user(self.user)
+        jti = token.payload['jti']
+        self.assertFalse(revoked_tokens.is_revoked(jti))
+
+        token.blacklist()
+
+        self.assertTrue(revoked_tokens.is_revoked(jti))
+        revoked_tokens._ready = False  # As while the listener reconnects
+        self.assertTrue(revoked_tokens.is_revoked(jti))
+
+
+@skipUnless(settings.JWT_BLACKLIST_BACKEND == 'redis', 'JWT_BLACKLIST_BACKEND is not redis')
+class RevocationFallbackTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = mock.MagicMock()
+        self.redis.exists.return_value = 0
+        patches = [
+            mock.patch.object(tokens, '_redis', return_value=self.redis),
+            mock.patch.object(revoked_tokens, '_ensure_listener'),
+            mock.patch.object(revoked_tokens, '_ready', False),
+            mock.patch.object(revoked_tokens, '_legacy_checked_at', None),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def refresh(self, token):
+        return APIClient().post('/api/accounts/token/refresh/', {'refresh': str(token)})
+
+    def test_tokens_blacklisted_in_the_database_stay_revoked(self):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+        revoked, valid = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        outstanding = OutstandingToken.objects.create(
+            user=self.user, jti=revoked['jti'], token=str(revoked),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        BlacklistedToken.objects.create(token=outstanding)
+
+        self.assertEqual(self.refresh(revoked).status_code, 401)
+        self.assertEqual(self.refresh(valid).status_code, 200)
+
+    def test_refresh_is_refused_while_redis_is_down(self):
+        self.redis.exists.side_effect = redis.ConnectionError('Connection refused')
+
+        response = self.refresh(RefreshToken.for_user(self.user))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.json()['error'])
+
+
+@skipUnless(REDIS, 'needs a Redis server at REDIS_URL')
+class SlidingWindowTests(SimpleTestCase):
+    def setUp(self):
+        self.key = f'test:{uuid.uuid4().hex}'
+        self.addCleanup(throttling.reset, self.key)
+
+    def test_requests_beyond_the_limit_are_denied_and_not_counted(self):
+        results = [throttling.hit(self.key, 3, 60) for _ in range(5)]
+
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False, False])
+        self.assertGreater(results[-1][1], 0)
+        self.assertEqual(int(throttling._redis().hget(f'ratelimit:{self.key}', 'count')), 3)
+
+    def test_concurrent_requests_never_exceed_the_limit(self):
+        allowed = []
+
+        def request():
+            allowed.append(throttling.hit(self.key, 5, 60)[0])
+
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(allowed.count(True), 5)
+
+    def test_reset_clears_the_window(self):
+        throttling.hit(self.key, 1, 60)
+        throttling.reset(self.key)
+
+        self.assertTrue(throttling.hit(self.key, 1, 60)[0])
+
+
+@override_settings(LOGIN_MAX_ATTEMPTS=2)
+class LoginAttemptTests(AccountsTestCase):
+    def login(self, password):
+        return APIClient().post('/api/accounts/login/', {'username': 'customer', 'password': password}, format='json')
+
+    def test_attempts_beyond_the_limit_are_refused(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(self.login('wrong').status_code, 401)
+
+        response = self.login('password')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_successful_login_resets_the_count(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(self.login('password').status_code, 200)
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(self.login('password').status_code, 200)
+
+
+class SingleSignOnBackend(BaseBackend):
+    """Accepts one fixed password for any existing user."""
+
+    def authenticate(self, request, username=None, password=None):
+        if password == 'sso-secret':
+            return User.objects.filter(username=username).first()
+        return None
+
+
+class AsyncAuthenticationTests(AccountsTestCase):
+    def login(self, username, password):
+        return APIClient().post('/api/accounts/login/', {'username': username, 'password': password}, format='json')
+
+    def test_failed_login_sends_user_login_failed(self):
+        failures = []
+
+        def receiver(sender, credentials, request, **kwargs):
+            failures.append(credentials)
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+
+        self.assertEqual(self.login('customer', 'wrong').status_code, 401)
+        self.assertEqual(self.login('nobody', 'wrong').status_code, 401)
+
+        self.assertEqual([credentials['username'] for credentials in failures], ['customer', 'nobody'])
+        self.assertNotEqual(failures[0]['password'], 'wrong')
+
+    def test_inactive_user_cannot_log_in(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self.login('customer', 'password').status_code, 401)
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'django.contrib.auth.backends.ModelBackend',
+        'accounts.tests.SingleSignOnBackend',
+    ])
+    def test_every_configured_backend_is_tried(self):
+        self.assertEqual(self.login('customer', 'password').status_code, 200)
+        self.assertEqual(self.login('customer', 'sso-secret').status_code, 200)
+        self.assertEqual(self.login('customer', 'wrong').status_code, 401)
+
+    def test_signup_normalizes_like_create_user(self):
+        response = APIClient().post('/api/accounts/signup/', {
+            'username': 'newcomer', 'email': 'Newcomer@Example.COM', 'password': 'a-long-passphrase-42',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='newcomer')
+        self.assertEqual(user.email, 'newcomer@example.com')
+        self.assertTrue(user.check_password('a-long-passphrase-42'))
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    @override_settings(DEBUG=False, METRICS_TOKEN='')
+    def test_not_served_in_production_without_a_token(self):
+        self.assertEqual(self.client.get(settings.METRICS_PATH).status_code, 404)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get(settings.METRICS_PATH).status_code, 403)
+
+        response = self.client.get(settings.METRICS_PATH, HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds', response.content)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN='')
+    def test_served_without_a_token_while_debugging(self):
+        self.assertEqual(self.client.get(settings.METRICS_PATH).status_code, 200)
+
+
+@override_settings(
+    CACHES=LOCAL_CACHES,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    REPLICA_DATABASES=['replica'],
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    # Not TestCase: reads inside its per-test transaction always go to the primary
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('customer', 'customer@example.com', 'password')
+        healthy = mock.patch.object(replicas.monitor, 'healthy', return_value=('replica',))
+        healthy.start()
+        self.addCleanup(healthy.stop)
+
+    def get_response(self, request):
+        # Where the view's reads would go
+        return HttpResponse(replicas.ReplicaRouter().db_for_read(User), status=201)
+
+    async def aget_response(self, request):
+        return self.get_response(request)
+
+    def request(self, method, user=None, session=False):
+        request = getattr(RequestFactory(), method)('/api/orders/')
+        if user is not None:
+            request.META['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        if session:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = 'session-key'
+            request.user = SimpleLazyObject(lambda: User.objects.get(pk=self.user.pk))
+        return request
+
+    def test_reads_after_a_write_are_pinned_to_the_primary(self):
+        middleware = replicas.ReplicaMiddleware(self.get_response)
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+
+        self.assertEqual(middleware(self.request('get', self.user)).content, b'replica')
+        middleware(self.request('post', self.user))
+
+        self.assertEqual(middleware(self.request('get', self.user)).content, b'default')
+        self.assertEqual(middleware(self.request('get', other)).content, b'replica')
+        self.assertEqual(middleware(self.request('get')).content, b'replica')
+
+    def test_writes_and_atomic_blocks_use_the_primary(self):
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_write(User), 'default')
+
+        with replicas.replica_reads():
+            self.assertEqual(router.db_for_read(User), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(User), 'default')
+
+    def add_lagging_replica(self):
+        """A 'replica' database that has only replayed the current users table."""
+        connections.settings['replica'] = {**connections.settings['default'], 'NAME': ':memory:'}
+        self.addCleanup(connections.settings.pop, 'replica')
+        self.addCleanup(connections['replica'].close)
+
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(User)
+        User.objects.using('replica').bulk_create(User.objects.all())
+
+    def test_authentication_reads_the_user_from_the_primary(self):
+        self.add_lagging_replica()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_user(self.user.pk)
+
+        with replicas.replica_reads():
+            self.assertTrue(User.objects.get(pk=self.user.pk).is_active)  # Not replayed yet
+            fields, values = get_user_row(self.user.pk)
+
+        self.assertFalse(dict(zip(fields, values))['is_active'])
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(client.get('/api/accounts/profile/').status_code, 401)
+
+    async def test_async_middleware_loads_the_session_user_off_the_loop(self):
+        middleware = replicas.ReplicaMiddleware(self.aget_response)
+
+        self.assertEqual((await middleware(self.request('get', session=True))).content, b'replica')
+        await middleware(self.request('post', session=True))
+
+        self.assertEqual((await middleware(self.request('get', session=True))).content, b'default')
+        self.assertEqual((await middleware(self.request('get', self.user))).content, b'default')
+
+
+class BrokerQueueTests(SimpleTestCase):
+    def test_every_routed_queue_is_declared(self):
+        routed = {route['queue'] for route in settings.CELERY_TASK_ROUTES.values()}
+
+        self.assertEqual(set(current_app.amqp.queues), routed | {settings.CELERY_TASK_DEFAULT_QUEUE})
+        self.assertEqual(set(current_app.amqp.queues), {'email', 'notifications', 'maintenance'})
@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken as BaseRefreshToken
+
+logger = logging.getLogger(__name__)
+
+REVOKED_PREFIX = 'revoked_jti'
+REVOKED_CHANNEL = 'revoked_jti'
+# How often each process checks whether simplejwt's tables still hold live revocations
+LEGACY_BLACKLIST_RECHECK = 300
+
+
+class RevocationUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Token revocation is temporarily unavailable. Please retry shortly.'
+    default_code = 'revocation_unavailable'
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection('default')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position // 8] |= 1 << (position % 8)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+
+class RevokedTokens:
+    """
+    Revoked refresh-token JTIs, kept in Redis as keys that expire with the
+    token itself.
+
+    Each process mirrors the revoked set into an in-process Bloom filter, so
+    checking a token that was never revoked (almost every refresh) needs no
+    Redis round trip. A daemon thread subscribes to revocations before
+    loading the existing keys, and the filter is only trusted while that
+    subscription is live; otherwise every lookup goes to Redis.
+
+    Tokens blacklisted in simplejwt's ``BlacklistedToken`` table before the
+    switch keep counting until they expire: while that table holds any
+    unexpired token, a JTI not found in Redis is also looked up there.
+    ``purge_token_blacklist --all`` copies them into Redis and ends that.
+
+    Without Redis a revocation can be neither recorded nor ruled out, so
+    both raise ``RevocationUnavailable`` (503).
+    """
+
+    def __init__(self):
+        self._filter = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._legacy = True
+        self._legacy_checked_at = None
+
+    def revoke(self, jti, exp):
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            return
+
+        try:
+            client = _redis()
+            pipe = client.pipeline(transaction=False)
+            pipe.set(f'{REVOKED_PREFIX}:{jti}', 1, ex=ttl)
+            pipe.publish(REVOKED_CHANNEL, jti)
+            pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not revoke refresh token {jti}: {e}")
+            raise RevocationUnavailable()
+
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def is_revoked(self, jti):
+        self._ensure_listener()
+
+        if not self._ready or jti in self._filter:
+            try:
+                if _redis().exists(f'{REVOKED_PREFIX}:{jti}'):
+                    return True
+            except RedisError as e:
+                logger.error(f"Could not check refresh token {jti}: {e}")
+                raise RevocationUnavailable()
+
+        return self._blacklisted_in_db(jti)
+
+    def _blacklisted_in_db(self, jti):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        now = time.monotonic()
+        if self._legacy_checked_at is None or now - self._legacy_checked_at >= LEGACY_BLACKLIST_RECHECK:
+            self._legacy = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()).exists()
+            self._legacy_checked_at = now
+
+        return self._legacy and BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def _ensure_listener(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='revoked-token-listener', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                client = _redis()
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REVOKED_CHANNEL)
+                self._reload(client)
+
+                for message in pubsub.listen():
+                    self._filter.add(message['data'].decode())
+
+                    if self._filter.count > self._filter.capacity:
+                        # Expired JTIs drop out of Redis, so a reload shrinks the set again
+                        self._ready = False
+                        self._reload(client)
+            except Exception as e:
+                logger.warning(f"Revoked token listener disconnected: {e}")
+                time.sleep(1)
+            finally:
+                self._ready = False
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _reload(self, client):
+        jtis = [
+            key.decode().split(':', 1)[1]
+            for key in client.scan_iter(match=f'{REVOKED_PREFIX}:*', count=1000)
+        ]
+        bloom = BloomFilter(
+            max(settings.JWT_REVOKED_FILTER_CAPACITY, 2 * len(jtis)),
+            settings.JWT_REVOKED_FILTER_ERROR_RATE
+        )
+
+        for jti in jtis:
+            bloom.add(jti)
+
+        self._filter = bloom
+        self._ready = True
+        logger.info(f"Loaded {bloom.count} revoked refresh tokens")
+
+
+revoked_tokens = RevokedTokens()
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    Refresh token whose blacklist lives in Redis when
+    ``JWT_BLACKLIST_BACKEND`` is ``'redis'``. No ``OutstandingToken`` rows
+    are written at login, and rotation or logout only sets a Redis key.
+    With the ``'db'`` backend it behaves like simplejwt's token.
+    """
+
+    if settings.JWT_BLACKLIST_BACKEND == 'redis':
+
+        def check_blacklist(self):
+            if revoked_tokens.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+                raise TokenError(_("Token is blacklisted"))
+
+        def blacklist(self):
+            revoked_tokens.revoke(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+
+        @classmethod
+        def for_user(cls, user):
+            # Skip BlacklistMixin.for_user, which records an OutstandingToken
+            return super(BlacklistMixin, cls).for_user(user)
+
+
+def import_blacklist(batch_size=1000):
+    """Copy still-valid JTIs from ``BlacklistedToken`` into the Redis store."""
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    rows = (
+        BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        .values_list('token__jti', 'token__expires_at')
+        .iterator(chunk_size=batch_size)
+    )
+    imported = 0
+
+    for jti, expires_at in rows:
+        revoked_tokens.revoke(jti, expires_at.timestamp())
+        imported += 1
+
+    return imported
+
+
+def purge_token_tables(batch_size=None, expired_only=True):
+    """
+    Delete ``OutstandingToken`` rows (and their ``BlacklistedToken`` rows)
+    in batches of ``batch_size``, one short transaction per batch, so the
+    tables can be emptied without a long lock. By default only expired
+    tokens are removed. Returns the number of outstanding tokens deleted.
+    """
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    batch_size = batch_size or settings.JWT_TOKEN_PURGE_BATCH_SIZE
+    queryset = OutstandingToken.objects.all()
+    if expired_only:
+        queryset = queryset.filter(expires_at__lte=timezone.now())
+
+    purged = 0
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+
+    logger.info(f"Purged {purged} outstanding tokens")
+    return purged
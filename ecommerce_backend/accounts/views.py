@@ -1,72 +1,78 @@
-from rest_framework import status, generics
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.views import TokenObtainPairView
-from django.contrib.auth import authenticate, get_user_model
-from django.core.cache import cache
+from rest_framework.permissions import IsAuthenticated
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.conf import settings
+from ecommerce_backend import async_api, replicas, throttling
+from ecommerce_backend.async_api import async_api_view
+from ecommerce_backend.throttling import AnonRateThrottle
 from .serializers import UserSerializer, LoginSerializer, ChangePasswordSerializer
+from . import hashing
+from .tokens import RefreshToken
 import logging
+import math
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-class SignupView(generics.CreateAPIView):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-    permission_classes = [AllowAny]
-    throttle_classes = [AnonRateThrottle]
-
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.save()
-        
-        refresh = RefreshToken.for_user(user)
-        
-        logger.info(f"New user registered: {user.username}")
-        
-        return Response({
-            'success': True,
-            'message': 'User registered successfully',
-            'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
-        }, status=status.HTTP_201_CREATED)
+@async_api_view(throttle_classes=[AnonRateThrottle])
+async def signup_view(request):
+    serializer = UserSerializer(data=request.data)
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    
+    encoded_password = await hashing.pool.arun(make_password, serializer.validated_data['password'])
+    user = await sync_to_async(serializer.save)(encoded_password=encoded_password)
+    # The new account may not have reached the replicas when its token is first used
+    await sync_to_async(replicas.pin_to_primary)(user.id)
+    
+    refresh = await sync_to_async(RefreshToken.for_user)(user)
+    
+    logger.info(f"New user registered: {user.username}")
+    
+    return async_api.response({
+        'success': True,
+        'message': 'User registered successfully',
+        'user': UserSerializer(user).data,
+        'tokens': {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    }, status=status.HTTP_201_CREATED)
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-@throttle_classes([AnonRateThrottle])
-def login_view(request):
+@async_api_view(throttle_classes=[AnonRateThrottle])
+async def login_view(request):
     serializer = LoginSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     
     username = serializer.validated_data['username']
     password = serializer.validated_data['password']
     
-    # Check for rate limiting
-    cache_key = f'login_attempts_{username}'
-    attempts = cache.get(cache_key, 0)
+    # Count the attempt before checking the password, atomically, so a
+    # parallel burst cannot slip past the limit
+    limit_key = f'login_attempts_{username}'
+    allowed, wait = await sync_to_async(throttling.hit_or_fallback)(
+        limit_key, settings.LOGIN_MAX_ATTEMPTS, settings.LOGIN_ATTEMPT_WINDOW
+    )
     
-    if attempts >= 5:
-        return Response(
-            {'error': True, 'message': 'Too many login attempts. Try again in 15 minutes.'},
-            status=status.HTTP_429_TOO_MANY_REQUESTS
+    if not allowed:
+        return async_api.response(
+            {'error': True, 'message': f'Too many login attempts. Try again in {math.ceil(wait / 60)} minutes.'},
+            status=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(math.ceil(wait))}
         )
     
-    user = authenticate(username=username, password=password)
+    user = await hashing.authenticate(request._request, username, password)
     
     if user:
-        cache.delete(cache_key)
-        refresh = RefreshToken.for_user(user)
+        await sync_to_async(throttling.reset)(limit_key)
+        refresh = await sync_to_async(RefreshToken.for_user)(user)
         
         logger.info(f"User logged in: {user.username}")
         
-        return Response({
+        return async_api.response({
             'success': True,
             'message': 'Login successful',
             'user': UserSerializer(user).data,
@@ -76,10 +82,7 @@ def login_view(request):
             }
         })
     
-    # Increment failed attempts
-    cache.set(cache_key, attempts + 1, 900)  # 15 minutes
-    
-    return Response(
+    return async_api.response(
         {'error': True, 'message': 'Invalid credentials'},
         status=status.HTTP_401_UNAUTHORIZED
     )
@@ -101,26 +104,26 @@ def profile_view(request):
         'user': serializer.data
     })
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def change_password_view(request):
+@async_api_view(authenticated=True)
+async def change_password_view(request):
     serializer = ChangePasswordSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
     
     user = request.user
+    encoded_password = await sync_to_async(lambda: user.password)()
     
-    if not user.check_password(serializer.validated_data['old_password']):
-        return Response(
+    if not await hashing.pool.arun(check_password, serializer.validated_data['old_password'], encoded_password):
+        return async_api.response(
             {'error': True, 'message': 'Old password is incorrect'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    user.set_password(serializer.validated_data['new_password'])
-    user.save()
+    user.password = await hashing.pool.arun(make_password, serializer.validated_data['new_password'])
+    await user.asave(update_fields=['password'])
     
     logger.info(f"Password changed for user: {user.username}")
     
-    return Response({
+    return async_api.response({
         'success': True,
         'message': 'Password changed successfully'
     })
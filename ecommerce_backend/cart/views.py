@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
 from .models import Cart, CartItem
 from .serializers import CartSerializer, CartItemSerializer
+from orders.idempotency import idempotent
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +15,8 @@ class CartViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Cart.objects.none()
         return Cart.objects.filter(user=self.request.user).prefetch_related('items__product')
 
     def get_cart(self):
@@ -27,8 +30,9 @@ class CartViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
 
-    @transaction.atomic
     @action(detail=False, methods=['post'])
+    @idempotent
+    @transaction.atomic
     def add_item(self, request):
         cart = self.get_cart()
         serializer = CartItemSerializer(data=request.data)
@@ -81,8 +85,9 @@ class CartViewSet(viewsets.ModelViewSet):
             'item': CartItemSerializer(cart_item).data
         }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-    @transaction.atomic
     @action(detail=False, methods=['patch'])
+    @idempotent
+    @transaction.atomic
     def update_item(self, request):
         cart = self.get_cart()
         item_id = request.data.get('item_id')
@@ -135,6 +140,7 @@ class CartViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=['delete'])
+    @idempotent
     def remove_item(self, request):
         cart = self.get_cart()
         item_id = request.query_params.get('item_id')
@@ -163,6 +169,7 @@ class CartViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=['delete'])
+    @idempotent
     def clear(self, request):
         cart = self.get_cart()
         item_count = cart.items.count()
@@ -0,0 +1,87 @@
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from functools import wraps
+from rest_framework import exceptions
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+
+def response(data, status=200, headers=None):
+    return JsonResponse(data, status=status, headers=headers, encoder=DjangoJSONEncoder, safe=False)
+
+
+def error_response(exc):
+    """The body ``custom_exception_handler`` gives DRF views, for async views."""
+    headers = {}
+    wait = getattr(exc, 'wait', None)
+    if wait is not None:
+        headers['Retry-After'] = str(math.ceil(wait))
+
+    return response({
+        'error': True,
+        'message': str(exc),
+        'status_code': exc.status_code,
+        'details': exc.detail,
+    }, status=exc.status_code, headers=headers)
+
+
+def _check(request, methods, throttle_classes, authenticated):
+    if request.method not in methods:
+        raise exceptions.MethodNotAllowed(request.method)
+
+    if authenticated and not (request.user and request.user.is_authenticated):
+        raise exceptions.NotAuthenticated()
+
+    for throttle in [throttle_class() for throttle_class in throttle_classes]:
+        if not throttle.allow_request(request, None):
+            raise exceptions.Throttled(throttle.wait())
+
+    # Parse the body here so the handler never touches the request stream
+    request.data
+
+
+def async_api_view(methods=('POST',), throttle_classes=None, authenticated=False):
+    """
+    Serve ``handler(request)`` as a native async Django view.
+
+    DRF 3.14 views are synchronous, so this gives async handlers the parts
+    of APIView they need: a DRF ``Request`` (JSON/form parsing and JWT
+    authentication), throttles, and the repo's JSON error body. That setup
+    runs in one ``sync_to_async`` call; the handler decides what else leaves
+    the event loop.
+    """
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES if throttle_classes is None else throttle_classes
+
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            request = Request(
+                request,
+                parsers=[JSONParser(), FormParser(), MultiPartParser()],
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            )
+
+            try:
+                await sync_to_async(_check)(request, methods, throttle_classes, authenticated)
+                return await handler(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+            except Exception as exc:
+                logger.error(f"Unhandled exception: {exc}", exc_info=True)
+                return response({
+                    'error': True,
+                    'message': 'An unexpected error occurred',
+                    'status_code': 500
+                }, status=500)
+
+        # csrf_exempt() only learned to wrap async views in Django 5.0
+        view.csrf_exempt = True
+        return view
+
+    return decorator
@@ -0,0 +1,275 @@
+"""
+In-process API benchmarks.
+
+``seed`` builds a deterministic catalog and order history with
+``datagen``; ``run_scenario`` drives the real URLs through the full
+middleware stack with Django's test client and reports throughput, latency
+percentiles and queries per request. ``compare`` checks a run against a
+saved baseline. See the ``benchmark`` management command.
+"""
+import platform
+import random
+import statistics
+import time
+from django import get_version
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from cart.models import Cart, CartItem
+from products.models import Category, Product
+from . import datagen
+
+PASSWORD = 'benchmark-password'
+PREFIX = 'benchmark'
+
+
+class Dataset:
+    def __init__(self, users, tokens, categories, products):
+        self.users = users            # [(id, username)]
+        self.tokens = tokens          # user id -> access token
+        self.categories = categories  # [id]
+        self.products = products      # [(id, slug)], most popular first
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+    def auth(self, user_id):
+        return {'HTTP_AUTHORIZATION': f'Bearer {self.tokens[user_id]}'}
+
+    def product(self, rng):
+        # Popularity is skewed: a few products get most of the traffic
+        index = min(int(rng.paretovariate(1.2)) - 1, len(self.products) - 1)
+        return self.products[index]
+
+
+def seed(users=50, categories=20, products=2000, orders_per_user=5, seed=0):
+    """Generate the dataset with ``datagen`` and load what the scenarios need."""
+    datagen.generate(datagen.defaults(
+        prefix=PREFIX, seed=seed, users=users, categories=categories, products=products,
+        orders=users * orders_per_user, password=make_password(PASSWORD),
+    ))
+
+    customers = list(
+        User.objects.filter(username__startswith=f'{PREFIX}-').order_by('id').values_list('id', 'username')
+    )
+    # Generated products are stocked from 0 to 500; keep checkouts from running out
+    Product.objects.update(stock=1_000_000)
+
+    return Dataset(
+        users=customers,
+        tokens={user_id: str(AccessToken.for_user(User(id=user_id))) for user_id, _ in customers},
+        categories=list(Category.objects.order_by('id').values_list('id', flat=True)),
+        products=list(Product.objects.order_by('id').values_list('id', 'slug')),
+    )
+
+
+def _add_cart_items(dataset, rng, user_id, count):
+    cart, _ = Cart.objects.get_or_create(user_id=user_id)
+    CartItem.objects.filter(cart=cart).delete()
+    products = {dataset.product(rng)[0] for _ in range(count)}
+    return CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=1) for product_id in products
+    ])
+
+
+# Each request function returns (method, path, data, headers) for iteration i;
+# the optional prepare function runs untimed just before it.
+
+def product_list(dataset, rng, i):
+    return 'get', f'/api/products/?page={rng.randint(1, 5)}', None, {}
+
+
+def product_search(dataset, rng, i):
+    return 'get', f'/api/products/?search={rng.choice(datagen.NOUNS)}', None, {}
+
+
+def product_filter(dataset, rng, i):
+    low = rng.randint(1, 250)
+    path = (
+        f'/api/products/?category={rng.choice(dataset.categories)}'
+        f'&min_price={low}&max_price={low + 100}&in_stock=true&ordering=price'
+    )
+    return 'get', path, None, {}
+
+
+def product_detail(dataset, rng, i):
+    return 'get', f'/api/products/{dataset.product(rng)[1]}/', None, {}
+
+
+def cart_add(dataset, rng, i):
+    user_id, _ = dataset.user(i)
+    data = {'product_id': dataset.product(rng)[0], 'quantity': 1}
+    return 'post', '/api/cart/add_item/', data, dataset.auth(user_id)
+
+
+def prepare_cart_update(dataset, rng, i):
+    user_id, _ = dataset.user(i)
+    if not CartItem.objects.filter(cart__user_id=user_id).exists():
+        _add_cart_items(dataset, rng, user_id, 3)
+
+
+def cart_update(dataset, rng, i):
+    user_id, _ = dataset.user(i)
+    item_id = CartItem.objects.filter(cart__user_id=user_id).values_list('id', flat=True).first()
+    data = {'item_id': item_id, 'quantity': rng.randint(1, 5)}
+    return 'patch', '/api/cart/update_item/', data, dataset.auth(user_id)
+
+
+def prepare_checkout(dataset, rng, i):
+    _add_cart_items(dataset, rng, dataset.user(i)[0], rng.randint(1, 4))
+
+
+def checkout(dataset, rng, i):
+    user_id, _ = dataset.user(i)
+    data = {'payment_method': 'cod', 'shipping_address': '1 Benchmark Street, Test City', 'phone': '+10000000000'}
+    return 'post', '/api/orders/', data, dataset.auth(user_id)
+
+
+def my_orders(dataset, rng, i):
+    user_id, _ = dataset.user(i)
+    return 'get', '/api/orders/my_orders/', None, dataset.auth(user_id)
+
+
+def login(dataset, rng, i):
+    _, username = dataset.user(i)
+    return 'post', '/api/accounts/login/', {'username': username, 'password': PASSWORD}, {}
+
+
+# name: (request, prepare, share of --requests). Login is dominated by
+# password hashing, so it gets fewer iterations.
+SCENARIOS = {
+    'product_list': (product_list, None, 1),
+    'product_search': (product_search, None, 1),
+    'product_filter': (product_filter, None, 1),
+    'product_detail': (product_detail, None, 1),
+    'cart_add': (cart_add, None, 1),
+    'cart_update': (cart_update, prepare_cart_update, 1),
+    'checkout': (checkout, prepare_checkout, 1),
+    'my_orders': (my_orders, None, 1),
+    'login': (login, None, 0.1),
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(cuts, p):
+    return round(cuts[p - 1] * 1000, 3)
+
+
+def run_scenario(name, dataset, requests, warmup, seed=0):
+    request, prepare, share = SCENARIOS[name]
+    requests = max(2, int(requests * share))
+    rng = random.Random(f'{seed}:{name}')
+    client = Client()
+    counter = QueryCounter()
+
+    latencies = []
+    queries = errors = 0
+    elapsed = 0.0
+
+    with connection.execute_wrapper(counter):
+        for i in range(warmup + requests):
+            if prepare is not None:
+                prepare(dataset, rng, i)
+            method, path, data, headers = request(dataset, rng, i)
+
+            before = counter.count
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, content_type='application/json', **headers)
+            duration = time.perf_counter() - start
+
+            if i < warmup:
+                continue
+
+            latencies.append(duration)
+            elapsed += duration
+            queries += counter.count - before
+            if response.status_code >= 400:
+                errors += 1
+
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / elapsed, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': percentile(cuts, 50),
+        'p95_ms': percentile(cuts, 95),
+        'p99_ms': percentile(cuts, 99),
+        'queries_per_request': round(queries / requests, 2),
+    }
+
+
+def environment(dataset_options):
+    return {
+        'created_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': get_version(),
+        'machine': platform.machine(),
+        'dataset': dataset_options,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of ``results`` against ``baseline``: latency (p95) or
+    throughput worse by more than ``tolerance``, or any increase in queries
+    per request, which does not depend on the machine.
+    """
+    regressions = []
+
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+
+        if current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append(
+                f"{name}: {current['queries_per_request']} queries per request, "
+                f"was {previous['queries_per_request']}"
+            )
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms, was {previous['p95_ms']} ms")
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {current['throughput_rps']} requests/s, was {previous['throughput_rps']}"
+            )
+
+    return regressions
+
+
+def _delay_query(execute, sql, params, many, context):
+    time.sleep(settings.BENCHMARK_DB_LATENCY)
+    return execute(sql, params, many, context)
+
+
+def _add_latency(sender, connection, **kwargs):
+    if _delay_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_delay_query)
+
+
+class DatabaseLatencyMiddleware:
+    """
+    Adds ``BENCHMARK_DB_LATENCY`` seconds to every query, as a database
+    across the network would. Only hooks the connections at startup and
+    never stays in the middleware chain.
+    """
+
+    def __init__(self, get_response):
+        if settings.BENCHMARK_DB_LATENCY:
+            connection_created.connect(_add_latency)
+        raise MiddlewareNotUsed
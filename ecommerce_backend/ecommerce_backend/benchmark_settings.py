@@ -0,0 +1,39 @@
+# Settings for `python manage.py benchmark --settings=ecommerce_backend.benchmark_settings`.
+# Same stack as production, minus what would make runs flaky or measure
+# something other than the request: rate limits, email and broker traffic.
+from decouple import config
+from .settings import *  # noqa: F401,F403
+
+BENCHMARK = True
+
+# DATABASE_URL still applies: leave it unset for SQLite, or point it at a
+# PostgreSQL server (the benchmark creates and drops its own test database).
+
+# Redis when BENCHMARK_USE_REDIS is set, otherwise an in-process cache
+if not config('BENCHMARK_USE_REDIS', default=False, cast=bool):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'benchmark',
+        }
+    }
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {scope: None for scope in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']},
+}
+
+# Simulated database round trip in seconds per query (see benchmark_concurrency)
+BENCHMARK_DB_LATENCY = config('BENCHMARK_DB_LATENCY', default=0.0, cast=float)
+MIDDLEWARE = ['ecommerce_backend.benchmark.DatabaseLatencyMiddleware', *MIDDLEWARE]
+
+# Outbox rows are still written in the request; nothing relays them
+OUTBOX_RELAY_MODE = 'off'
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'], 'level': 'ERROR'},
+}
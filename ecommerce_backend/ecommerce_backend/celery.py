@@ -1,5 +1,7 @@
 import os
+import shutil
 from celery import Celery
+from celery.signals import before_task_publish, celeryd_init, task_postrun, task_prerun, worker_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings')
 
@@ -10,3 +12,50 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+# Tasks declared with read_only=True read from a replica
+@task_prerun.connect
+def replica_reads_on(task=None, **kwargs):
+    from . import replicas
+    replicas.task_started(task)
+
+
+@task_postrun.connect
+def replica_reads_off(task=None, **kwargs):
+    from . import replicas
+    replicas.task_finished(task)
+
+
+# Task runtime and queue-wait metrics
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    from . import metrics
+    metrics.task_published(headers)
+
+
+@task_prerun.connect
+def task_metrics_start(task=None, **kwargs):
+    from . import metrics
+    metrics.task_started(task)
+
+
+@task_postrun.connect
+def task_metrics_finish(task=None, state=None, **kwargs):
+    from . import metrics
+    metrics.task_finished(task, state)
+
+
+@celeryd_init.connect
+def clear_metrics_dir(**kwargs):
+    # Samples from a previous run would be merged into this one (as in gunicorn.conf.py)
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+@worker_init.connect
+def serve_task_metrics(**kwargs):
+    from . import metrics
+    metrics.serve_task_metrics()
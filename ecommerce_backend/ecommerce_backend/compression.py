@@ -0,0 +1,153 @@
+"""
+Negotiated compression of API responses: zstd, brotli or gzip, whichever
+the client accepts with the highest q-value (ties go to the order in
+``CODINGS``). zstd and brotli are used when their packages are installed.
+
+Only non-streaming responses to GET and HEAD are compressed, so SSE streams
+and CSV exports flow unbuffered, and POST responses carrying tokens next to
+client-supplied data are never compressed (BREACH).
+
+A view serving a body from a cache sets ``response.compression_cache_key``
+to a key that changes whenever the body does (e.g. its ETag); each encoding
+is then compressed once and kept in a two-tier cache next to it instead of
+on every request. Views whose bodies are built per request but are the same
+for many clients (the catalog) use ``cache_compressed``, which keys them by
+a digest of the body.
+"""
+import gzip
+import hashlib
+import re
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from .tiered_cache import TieredCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'application/xml')
+
+STRONG_ETAG = re.compile(r'^"[^"]*"$')
+
+
+def _codings():
+    codings = {}
+    if zstandard is not None:
+        codings['zstd'] = lambda data: zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(data)
+    if brotli is not None:
+        codings['br'] = lambda data: brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    codings['gzip'] = lambda data: gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+    return codings
+
+
+CODINGS = _codings()
+
+variants = TieredCache(
+    'compressed_response', settings.COMPRESSION_CACHE_TTL, max_size=settings.COMPRESSION_CACHE_SIZE,
+)
+
+
+def negotiate(accept_encoding):
+    """The coding to use for an ``Accept-Encoding`` header, or ``None`` for identity."""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in CODINGS:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(content, coding, cache_key=None):
+    if cache_key is None:
+        return CODINGS[coding](content)
+    return variants.get_or_compute(f'{cache_key}:{coding}', lambda: CODINGS[coding](content))
+
+
+def cache_compressed(response, prefix):
+    """Key ``response``'s compressed variants by its body, once it is rendered."""
+    def set_key(response):
+        response.compression_cache_key = f'{prefix}:{hashlib.sha256(response.content).hexdigest()}'
+
+    if getattr(response, 'is_rendered', True):
+        set_key(response)
+    else:
+        response.add_post_render_callback(set_key)
+    return response
+
+
+def compressible(request, response):
+    if request.method not in ('GET', 'HEAD') or response.streaming or response.has_header('Content-Encoding'):
+        return False
+    if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+        return False
+    return response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_response(request, response):
+    if not compressible(request, response):
+        return response
+
+    # Caches must key on the header whether or not this response is compressed
+    patch_vary_headers(response, ('Accept-Encoding',))
+    coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if coding is None:
+        return response
+
+    compressed = compress(response.content, coding, getattr(response, 'compression_cache_key', None))
+    if len(compressed) >= len(response.content):
+        return response
+
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = coding
+    # The compressed body is no longer byte-identical to what a strong ETag
+    # promised (as in Django's GZipMiddleware)
+    etag = response.get('ETag')
+    if etag and STRONG_ETAG.match(etag):
+        response['ETag'] = f'W/{etag}'
+    return response
+
+
+class CompressionMiddleware:
+    """Compress eligible responses with the coding negotiated from ``Accept-Encoding``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return compress_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if getattr(response, 'compression_cache_key', None) is not None:
+            # Cached variants are read from Redis
+            return await sync_to_async(compress_response)(request, response)
+        return compress_response(request, response)
@@ -0,0 +1,330 @@
+"""
+Synthetic data at production scale, for reproducing performance problems
+locally (see the ``generate_dataset`` command).
+
+Rows are built in memory and written with ``bulk_create`` in batches,
+skipping the per-row ``save()`` work: slugs, order item names, subtotals
+and timestamps are filled in directly and no signals are sent. Primary
+keys are assigned up front (position ``i`` of a phase gets ``first id +
+i``), so chunks never read ids back and can run in any process. Each chunk
+has its own seeded RNG, so a seed and batch size produce the same data
+whatever the number of worker processes.
+
+Popularity is skewed with a Zipf distribution over generation order: the
+first products are the most popular and the first users order the most.
+"""
+import itertools
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from multiprocessing import get_context
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from accounts.models import User
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from products.models import Category, Product
+
+ADJECTIVES = ('classic', 'compact', 'deluxe', 'eco', 'lightweight', 'premium', 'rugged', 'smart', 'vintage', 'wireless')
+NOUNS = ('backpack', 'blender', 'camera', 'chair', 'headphones', 'jacket', 'keyboard', 'lamp', 'watch', 'speaker')
+
+QUANTITIES = (1, 2, 3, 4, 5)
+QUANTITY_WEIGHTS = (70, 18, 7, 3, 2)
+
+# (minimum age in days, statuses, weights): old orders have mostly settled
+STATUS_BY_AGE = (
+    (14, ('delivered', 'cancelled'), (90, 10)),
+    (3, ('shipped', 'delivered', 'cancelled'), (50, 40, 10)),
+    (0, ('pending', 'processing', 'shipped', 'cancelled'), (40, 40, 10, 10)),
+)
+
+# Tables whose ids are assigned here, by phase; their sequences are reset afterwards
+SEQUENCED = {
+    'users': User,
+    'categories': Category,
+    'products': Product,
+    'carts': Cart,
+    'orders': Order,
+}
+
+# Per-process lookups, built once by the first chunk that needs them
+_state = {}
+
+
+def defaults(**options):
+    """Generation options; every chunk receives the same dict."""
+    return {
+        'prefix': 'synthetic',
+        'seed': 0,
+        'users': 1000,
+        'categories': 50,
+        'products': 10000,
+        'orders': 10000,
+        'cart_ratio': 0.2,
+        'items_per_order': 2.5,
+        'items_per_cart': 2.0,
+        'product_skew': 1.1,
+        'customer_skew': 0.6,
+        'days': 365,
+        'batch_size': 5000,
+        'password': '!',  # Unusable; pass an encoded password to allow logins
+        **options,
+    }
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let bulk_create keep the created_at/updated_at values we generate."""
+    fields = [
+        field
+        for model in (User, Category, Product, Cart, CartItem, Order)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def chunk_rng(options, phase, start):
+    # The prefix keeps order numbers unique between datasets with the same seed
+    return random.Random(f"{options['prefix']}:{options['seed']}:{phase}:{start}")
+
+
+def random_time(rng, options, now):
+    return now - timedelta(seconds=rng.random() * options['days'] * 86400)
+
+
+def extra_items(rng, mean):
+    """Items beyond the first, geometric-ish with the given overall mean."""
+    return int(rng.expovariate(1 / (mean - 1))) if mean > 1 else 0
+
+
+def ids(options, phase):
+    first = options['first_ids'][phase]
+    return range(first, first + options['users' if phase == 'carts' else phase])
+
+
+class Population:
+    """Ids to draw from, with Zipf weights by position when ``skew`` is set."""
+
+    def __init__(self, ids, skew=0):
+        self.ids = ids
+        self.cum_weights = None
+        if skew:
+            self.cum_weights = list(itertools.accumulate(rank ** -skew for rank in range(1, len(ids) + 1)))
+
+    def sample(self, rng, k):
+        if self.cum_weights is None:
+            return [self.ids[int(rng.random() * len(self.ids))] for _ in range(k)]
+        return rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+
+def _lookup(name, options):
+    if name not in _state:
+        if name == 'customers':
+            _state[name] = Population(ids(options, 'users'), options['customer_skew'])
+        elif name == 'products':
+            _state[name] = Population(ids(options, 'products'), options['product_skew'])
+        elif name == 'catalog':
+            product_ids = ids(options, 'products')
+            rows = Product.objects.filter(
+                id__gte=product_ids.start, id__lt=product_ids.stop
+            ).values_list('id', 'name', 'price')
+            _state[name] = {
+                product_id: (product_name, price)
+                for product_id, product_name, price in rows.iterator(chunk_size=options['batch_size'])
+            }
+    return _state[name]
+
+
+def users_chunk(options, start, stop):
+    rng = chunk_rng(options, 'users', start)
+    now = timezone.now()
+    prefix = options['prefix']
+    user_ids = ids(options, 'users')
+
+    users = []
+    for i in range(start, stop):
+        created_at = random_time(rng, options, now)
+        users.append(User(
+            id=user_ids[i], username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com',
+            password=options['password'], first_name=f'Customer {i}',
+            phone=f'+1{rng.randrange(10 ** 9, 10 ** 10)}', address=f'{rng.randint(1, 9999)} Synthetic Street',
+            date_joined=created_at, created_at=created_at, updated_at=created_at,
+        ))
+
+    User.objects.bulk_create(users, batch_size=options['batch_size'])
+    return len(users)
+
+
+def categories_chunk(options, start, stop):
+    now = timezone.now()
+    prefix = options['prefix']
+    category_ids = ids(options, 'categories')
+
+    Category.objects.bulk_create([
+        Category(
+            id=category_ids[i], name=f'{prefix} category {i}', slug=f'{prefix}-category-{i}',
+            created_at=now, updated_at=now,
+        )
+        for i in range(start, stop)
+    ], batch_size=options['batch_size'])
+    return stop - start
+
+
+def products_chunk(options, start, stop):
+    rng = chunk_rng(options, 'products', start)
+    now = timezone.now()
+    prefix = options['prefix']
+    product_ids = ids(options, 'products')
+    category_ids = ids(options, 'categories')
+
+    products = []
+    for i in range(start, stop):
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        created_at = random_time(rng, options, now)
+        products.append(Product(
+            id=product_ids[i], category_id=rng.choice(category_ids), name=f'{adjective.title()} {noun} {i}',
+            slug=f'{prefix}-{adjective}-{noun}-{i}', description=f'A {adjective} {noun}.',
+            price=Decimal(rng.randint(199, 99999)) / 100, stock=rng.randint(0, 500),
+            featured=rng.random() < 0.02, created_at=created_at, updated_at=created_at,
+        ))
+
+    Product.objects.bulk_create(products, batch_size=options['batch_size'])
+    return len(products)
+
+
+def carts_chunk(options, start, stop):
+    """Carts for a share (``cart_ratio``) of the users at positions [start, stop)."""
+    rng = chunk_rng(options, 'carts', start)
+    now = timezone.now()
+    user_ids = ids(options, 'users')
+    # One cart id per user position, leaving gaps for users without a cart
+    cart_ids = ids(options, 'carts')
+    products = _lookup('products', options)
+
+    carts, items = [], []
+    for i in range(start, stop):
+        if rng.random() >= options['cart_ratio']:
+            continue
+
+        updated_at = now - timedelta(seconds=rng.random() * 7 * 86400)
+        carts.append(Cart(id=cart_ids[i], user_id=user_ids[i], created_at=updated_at, updated_at=updated_at))
+
+        count = 1 + extra_items(rng, options['items_per_cart'])
+        for product_id in dict.fromkeys(products.sample(rng, count)):
+            items.append(CartItem(
+                cart_id=cart_ids[i], product_id=product_id,
+                quantity=rng.choices(QUANTITIES, QUANTITY_WEIGHTS)[0], added_at=updated_at,
+            ))
+
+    with transaction.atomic():
+        Cart.objects.bulk_create(carts, batch_size=options['batch_size'])
+        CartItem.objects.bulk_create(items, batch_size=options['batch_size'])
+    return len(carts) + len(items)
+
+
+def orders_chunk(options, start, stop):
+    rng = chunk_rng(options, 'orders', start)
+    now = timezone.now()
+    order_ids = ids(options, 'orders')
+    customers = _lookup('customers', options)
+    products = _lookup('products', options)
+    catalog = _lookup('catalog', options)
+
+    orders, items = [], []
+    for i, user_id in zip(range(start, stop), customers.sample(rng, stop - start)):
+        created_at = random_time(rng, options, now)
+        age = (now - created_at).days
+        _, statuses, weights = next(rule for rule in STATUS_BY_AGE if age >= rule[0])
+        status = rng.choices(statuses, weights)[0]
+
+        order = Order(
+            id=order_ids[i], order_number=uuid.UUID(int=rng.getrandbits(128), version=4),
+            user_id=user_id, status=status, payment_method=rng.choice(Order.PAYMENT_CHOICES)[0],
+            shipping_address=f'{rng.randint(1, 9999)} Synthetic Street', phone='+10000000000',
+            email_sent=True, total_amount=0, item_count=0, created_at=created_at,
+            updated_at=created_at if status == 'pending' else created_at + timedelta(hours=rng.randint(1, 72)),
+        )
+        orders.append(order)
+
+        count = 1 + extra_items(rng, options['items_per_order'])
+        for product_id in dict.fromkeys(products.sample(rng, count)):
+            product_name, price = catalog[product_id]
+            quantity = rng.choices(QUANTITIES, QUANTITY_WEIGHTS)[0]
+            subtotal = price * quantity
+            order.total_amount += subtotal
+            order.item_count += quantity
+            items.append(OrderItem(
+                order_id=order.id, product_id=product_id, product_name=product_name,
+                quantity=quantity, price=price, subtotal=subtotal,
+            ))
+
+    with transaction.atomic():
+        Order.objects.bulk_create(orders, batch_size=options['batch_size'])
+        OrderItem.objects.bulk_create(items, batch_size=options['batch_size'])
+    return len(orders) + len(items)
+
+
+def _run_chunk(args):
+    chunk, options, start, stop = args
+    with explicit_timestamps():
+        return chunk(options, start, stop)
+
+
+# (phase, chunk function, option holding the number of positions to cover)
+PHASES = (
+    ('users', users_chunk, 'users'),
+    ('categories', categories_chunk, 'categories'),
+    ('products', products_chunk, 'products'),
+    ('carts', carts_chunk, 'users'),
+    ('orders', orders_chunk, 'orders'),
+)
+
+
+def run_phase(chunk, options, total, workers=1):
+    """Run ``chunk`` over positions [0, total) and yield the rows each chunk inserted."""
+    size = options['batch_size'] * 10
+    chunks = [(chunk, options, start, min(start + size, total)) for start in range(0, total, size)]
+
+    if workers <= 1:
+        yield from map(_run_chunk, chunks)
+        return
+
+    # Children must open their own connections rather than share the parent's socket
+    connections.close_all()
+    with get_context('fork').Pool(workers) as pool:
+        yield from pool.imap_unordered(_run_chunk, chunks)
+
+
+def generate(options, workers=1, progress=None):
+    """
+    Create every phase in order; ``progress(phase, rows, seconds)`` is
+    called after each. Nothing else should write these tables meanwhile.
+    """
+    _state.clear()
+    options = {**options, 'first_ids': {
+        phase: (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1 for phase, model in SEQUENCED.items()
+    }}
+
+    try:
+        for phase, chunk, positions in PHASES:
+            started = time.monotonic()
+            rows = sum(run_phase(chunk, options, options[positions], 1 if phase == 'categories' else workers))
+            if progress is not None:
+                progress(phase, rows, time.monotonic() - started)
+    finally:
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), SEQUENCED.values()):
+                cursor.execute(sql)
@@ -0,0 +1,143 @@
+"""
+Logging off the request thread.
+
+``QueueingHandler`` only puts records on a bounded in-memory queue; a
+``QueueListener`` thread formats them (as JSON by default) and writes them
+to stderr, so a slow stdout pipe never adds to request latency. When the
+queue is full the record is dropped and counted rather than waited for.
+
+``SamplingFilter`` keeps a share of the INFO and DEBUG records from busy
+loggers (``LOG_SAMPLE_RATES``) before they reach the queue; warnings and
+errors are always kept.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import weakref
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from prometheus_client import Counter
+
+DROPPED = Counter('log_records_dropped_total', 'Log records dropped because the logging queue was full')
+
+# Attributes every LogRecord has; anything else was passed in ``extra``
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_handlers = weakref.WeakSet()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with any ``extra`` fields alongside the standard ones."""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep INFO and DEBUG records from a logger (or its children) in
+    ``rates`` with that probability. Kept records carry ``sample_rate`` so
+    counts can be scaled back up.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+
+        rate = self.rate(record.name)
+        if rate is None:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class QueueingHandler(QueueHandler):
+    """
+    Enqueue records for a listener thread that formats and writes them.
+    The formatter configured for this handler is applied on the listener.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        self.maxsize = maxsize
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        super().__init__(queue.Queue(maxsize))
+        self.listener = None
+        self.start()
+        _handlers.add(self)
+
+    def start(self):
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Records stay in this process, so nothing needs pickling; only fix the
+        # message now in case its arguments change before the listener runs
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            DROPPED.inc()
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            try:
+                listener.stop()  # Writes out whatever is still queued
+            except queue.Full:
+                pass
+        super().close()
+
+
+def _restart_in_child():
+    # The listener thread does not survive a fork (gunicorn and Celery
+    # workers); give the child a fresh queue and its own listener
+    for handler in list(_handlers):
+        if handler.listener is not None:
+            handler.queue = queue.Queue(handler.maxsize)
+            handler.start()
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
@@ -0,0 +1,269 @@
+"""
+Prometheus instrumentation: per-view request latency, DB query count and
+time, cache hits and misses, and response size; per-task runtime and
+queue wait for Celery workers.
+
+Request-scoped counts live in a context variable, so the DB execute wrapper
+and the cache backend only bump two integers on the hot path; labelled
+metrics are observed once per request by ``MetricsMiddleware``. Under
+gunicorn, ``gunicorn.conf.py`` gives each server its own
+``PROMETHEUS_MULTIPROC_DIR`` and ``/metrics`` aggregates its workers.
+``/metrics`` needs ``METRICS_TOKEN`` unless ``DEBUG`` is on.
+"""
+import logging
+import os
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextvars import ContextVar
+from datetime import datetime
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.utils.crypto import constant_time_compare
+from django_redis.cache import RedisCache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    start_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent serving a request', ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries run per request', ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries per request', ['view'],
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Response body size', ['view'],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+CACHE_REQUESTS = Counter(
+    'http_request_cache_gets_total', 'Cache lookups made while serving requests', ['view', 'result'],
+)
+TASK_RUNTIME = Histogram(
+    'celery_task_duration_seconds', 'Time spent running a Celery task', ['task', 'queue', 'state'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 1800),
+)
+TASK_QUEUE_WAIT = Histogram(
+    'celery_task_queue_wait_seconds', 'Time from publishing a task (or its ETA) until a worker starts it',
+    ['task', 'queue'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+
+UNRESOLVED = 'unresolved'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    __slots__ = ('view', 'queries', 'db_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.view = UNRESOLVED
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+def view_name(view_func, method):
+    """``ProductViewSet.list`` for viewset actions, the class or function name otherwise."""
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+
+    if cls is not None and actions:
+        return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+    if cls is not None and cls.__name__ != 'WrappedAPIView':
+        return cls.__name__
+    return getattr(view_func, '__name__', UNRESOLVED)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_instrument_connection)
+
+# Connections opened before this module was imported (management commands, tests)
+for _connection in connections.all(initialized_only=True):
+    _instrument_connection(None, _connection)
+
+
+class InstrumentedRedisCache(RedisCache):
+    """django_redis backend that counts hits and misses for the current request."""
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, self._missing, version=version, client=client)
+        stats = _current.get()
+
+        if value is self._missing:
+            if stats is not None:
+                stats.cache_misses += 1
+            return default
+
+        if stats is not None:
+            stats.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        values = super().get_many(keys, version=version, client=client)
+        stats = _current.get()
+
+        if stats is not None:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
+
+
+class MetricsMiddleware:
+    """
+    Outermost middleware: times the whole request and observes its stats.
+    Sync and async capable, so ASGI views keep running on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if request.path == settings.METRICS_PATH:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if request.path == settings.METRICS_PATH:
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, stats, duration):
+        view = stats.view
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(duration)
+        DB_QUERIES.labels(view).observe(stats.queries)
+        DB_TIME.labels(view).observe(stats.db_time)
+
+        # Streams (order events) are open for minutes; only their setup is timed
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view).observe(len(response.content))
+        if stats.cache_hits:
+            CACHE_REQUESTS.labels(view, 'hit').inc(stats.cache_hits)
+        if stats.cache_misses:
+            CACHE_REQUESTS.labels(view, 'miss').inc(stats.cache_misses)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _current.get()
+        if stats is not None:
+            stats.view = view_name(view_func, request.method)
+
+
+def registry():
+    """Every process's samples under gunicorn or a Celery pool, this process's otherwise."""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        # Only served without a token while developing
+        if not settings.DEBUG:
+            return HttpResponseNotFound()
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def _task_queue(task):
+    return (task.request.delivery_info or {}).get('routing_key') or 'unknown'
+
+
+def task_published(headers):
+    headers['published_at'] = time.time()
+
+
+def task_started(task):
+    request = task.request
+    request.metrics_started = time.perf_counter()
+
+    published_at = getattr(request, 'published_at', None)
+    if published_at is None:
+        return  # Run eagerly, or published before this header existed
+
+    ready_at = published_at
+    if request.eta:
+        # Retries with a countdown are not waiting in the queue until then
+        eta = request.eta if isinstance(request.eta, datetime) else datetime.fromisoformat(request.eta)
+        ready_at = max(ready_at, eta.timestamp())
+    TASK_QUEUE_WAIT.labels(task.name, _task_queue(task)).observe(max(time.time() - ready_at, 0))
+
+
+def task_finished(task, state):
+    started = getattr(task.request, 'metrics_started', None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name, _task_queue(task), state or 'unknown').observe(time.perf_counter() - started)
+
+
+def serve_task_metrics():
+    """Serve this Celery worker's metrics on ``CELERY_METRICS_PORT``."""
+    if not settings.CELERY_METRICS_PORT:
+        return
+
+    try:
+        start_http_server(settings.CELERY_METRICS_PORT, registry=registry())
+    except OSError as e:
+        logger.warning(f"Could not serve task metrics on port {settings.CELERY_METRICS_PORT}: {e}")
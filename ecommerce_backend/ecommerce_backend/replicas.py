@@ -0,0 +1,269 @@
+"""
+Read-replica routing.
+
+Reads go to a replica only inside ``replica_reads()``: for safe-method
+requests (``ReplicaMiddleware``) and for Celery tasks declared with
+``read_only=True``. Everything else, including every read in a write
+transaction, stays on ``default``.
+
+A user who has just written is pinned to the primary for
+``REPLICA_PIN_SECONDS`` so they read their own writes. Replicas that are
+down or further behind than ``REPLICA_MAX_LAG`` seconds are skipped, and
+with no usable replica reads fall back to the primary.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_reads = ContextVar('replica_reads', default=False)
+
+# PostgreSQL: seconds since the last replayed transaction, or 0 when the
+# replica has replayed everything it received (an idle primary is not lag)
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+def replica_aliases():
+    return settings.REPLICA_DATABASES
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _reads.set(enabled)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+def pin_key(user_id):
+    return f'db_primary_pin_{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send ``user_id``'s reads to the primary until replicas have caught up with their write."""
+    try:
+        cache.set(pin_key(user_id), 1, settings.REPLICA_PIN_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not pin user {user_id} to the primary: {e}")
+
+
+async def apin_to_primary(user_id):
+    try:
+        await cache.aset(pin_key(user_id), 1, settings.REPLICA_PIN_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not pin user {user_id} to the primary: {e}")
+
+
+def is_pinned(user_id):
+    try:
+        return cache.get(pin_key(user_id)) is not None
+    except Exception as e:
+        # Unknown: assume a recent write
+        logger.warning(f"Could not read the primary pin for user {user_id}: {e}")
+        return True
+
+
+async def ais_pinned(user_id):
+    try:
+        return await cache.aget(pin_key(user_id)) is not None
+    except Exception as e:
+        logger.warning(f"Could not read the primary pin for user {user_id}: {e}")
+        return True
+
+
+class ReplicaMonitor:
+    """
+    Checks every replica's reachability and lag every
+    ``REPLICA_CHECK_INTERVAL`` seconds on a daemon thread. Until the first
+    check has passed a replica is not used.
+    """
+
+    def __init__(self):
+        self._healthy = ()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def healthy(self):
+        self._ensure_started()
+        return self._healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(LAG_SQL)
+                    lag = float(cursor.fetchone()[0])
+                else:
+                    cursor.execute('SELECT 1')
+                    lag = 0.0
+        except Exception as e:
+            logger.warning(f"Replica {alias} is unavailable: {e}")
+            connection.close()
+            return False
+
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning(f"Replica {alias} is {lag:.1f}s behind; reading from the primary")
+            return False
+        return True
+
+    def refresh(self):
+        self._healthy = tuple(alias for alias in replica_aliases() if self.check(alias))
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='replica-monitor', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Replica monitor failed: {e}")
+            time.sleep(settings.REPLICA_CHECK_INTERVAL)
+
+
+monitor = ReplicaMonitor()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from where their parent was read
+            return instance._state.db
+
+        if not _reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        healthy = monitor.healthy()
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+def request_user_id(request):
+    """The user behind a JWT (without touching the database), or the session user."""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.settings import api_settings
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is not None:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is not None:
+            try:
+                return authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+            except Exception:
+                return None
+
+    # Admin pages: only resolve the session user when there is a session
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+        return request.user.pk
+    return None
+
+
+def written_by(request, response):
+    """The user to pin after an unsafe request, if it may have written anything."""
+    if response.status_code >= 400:
+        return None
+
+    user = getattr(request, 'user', None)  # Set by DRF once it authenticates
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return request_user_id(request)
+
+
+async def off_the_loop(func, request, *args):
+    """
+    ``func(request, *args)`` for async middleware. With a session cookie
+    ``request.user`` is loaded from the database, so that runs in a thread.
+    """
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return await sync_to_async(func)(request, *args)
+    return func(request, *args)
+
+
+class ReplicaMiddleware:
+    """
+    Runs safe-method requests in ``replica_reads()`` unless the user is
+    pinned, and pins users after their unsafe requests. Does nothing when
+    no replica is configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not replica_aliases():
+            return self.get_response(request)
+
+        if request.method in SAFE_METHODS:
+            user_id = request_user_id(request)
+            with replica_reads(user_id is None or not is_pinned(user_id)):
+                return self.get_response(request)
+
+        response = self.get_response(request)
+        user_id = written_by(request, response)
+        if user_id is not None:
+            pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+
+        if request.method in SAFE_METHODS:
+            user_id = await off_the_loop(request_user_id, request)
+            with replica_reads(user_id is None or not await ais_pinned(user_id)):
+                return await self.get_response(request)
+
+        response = await self.get_response(request)
+        user_id = await off_the_loop(written_by, request, response)
+        if user_id is not None:
+            await apin_to_primary(user_id)
+        return response
+
+
+def task_started(task):
+    if getattr(task, 'read_only', False):
+        _reads.set(True)
+
+
+def task_finished(task):
+    if getattr(task, 'read_only', False):
+        _reads.set(False)
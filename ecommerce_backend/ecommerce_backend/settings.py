@@ -1,12 +1,8 @@
-import os
 import dj_database_url
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
-
-
-import os
-print("DEBUG DATABASE_URL:", os.getenv("DATABASE_URL"))
+from decouple import Csv, config
+from kombu import Queue
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,14 +39,26 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'django_filters',
-    'drf_yasg',
     'accounts',
     'products',
     'cart',
     'orders',
 ]
 
+# Swagger/ReDoc UIs and drf_yasg itself are only loaded when enabled;
+# /swagger.json is always served from the prebuilt artifact
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=DEBUG, cast=bool)
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
+API_SCHEMA_PATH = config('API_SCHEMA_PATH', default=str(BASE_DIR / 'schema' / 'openapi.json'))
+API_SCHEMA_MAX_AGE = config('API_SCHEMA_MAX_AGE', default=60 * 60, cast=int)
+SWAGGER_SETTINGS = {'SPEC_URL': '/swagger.json'}
+REDOC_SETTINGS = {'SPEC_URL': '/swagger.json'}
+
 MIDDLEWARE = [
+    'ecommerce_backend.metrics.MetricsMiddleware',
+    'ecommerce_backend.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -58,6 +66,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ecommerce_backend.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,11 +100,28 @@ DATABASES = {
     )
 }
 
+# Read replicas (comma-separated URLs) for safe-method requests and
+# read-only Celery tasks; see ecommerce_backend/replicas.py
+REPLICA_DATABASES = []
+for number, url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv()), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['ecommerce_backend.replicas.ReplicaRouter']
+# Seconds between replica health checks; replicas further behind are skipped
+REPLICA_CHECK_INTERVAL = config('REPLICA_CHECK_INTERVAL', default=5, cast=int)
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5, cast=float)
+# How long a user's reads stay on the primary after they write
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
 # Redis - use Railway's REDIS_URL
 REDIS_URL = config('REDIS_URL', default='redis://127.0.0.1:6379/1')
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        # django_redis' RedisCache, counting hits and misses for /metrics
+        'BACKEND': 'ecommerce_backend.metrics.InstrumentedRedisCache',
         'LOCATION': REDIS_URL,
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -114,8 +140,104 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
-CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# Results are only kept for tasks that don't set ignore_result, and not for long
+CELERY_RESULT_EXPIRES = 60 * 60
+# Each queue has its own worker in the Procfile: 'email' for order emails
+# (and the outbox sweep that feeds them), 'notifications' for bulk-update
+# emails, 'maintenance' for purges, archiving and sales rollups
+CELERY_TASK_DEFAULT_QUEUE = 'maintenance'
+# Declared up front so the broker health check reports all three
+CELERY_TASK_QUEUES = (
+    Queue('email'),
+    Queue('notifications'),
+    Queue('maintenance'),
+)
+CELERY_TASK_ROUTES = {
+    'orders.tasks.send_order_emails': {'queue': 'email'},
+    'orders.tasks.send_order_confirmation_email': {'queue': 'email'},
+    'orders.tasks.send_order_status_update_email': {'queue': 'email'},
+    'orders.tasks.relay_outbox': {'queue': 'email'},
+    'orders.tasks.send_bulk_order_emails': {'queue': 'notifications'},
+    '*': {'queue': 'maintenance'},
+}
+# One message reserved per worker process beyond the one running (the email
+# worker raises this in the Procfile); acks_late tasks lost with a killed
+# worker process are redelivered
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+# send_bulk_order_emails batches per worker process
+BULK_EMAIL_RATE_LIMIT = config('BULK_EMAIL_RATE_LIMIT', default='30/m')
+# Port each worker serves task runtime and queue-wait metrics on; 0 disables.
+# Set PROMETHEUS_MULTIPROC_DIR for the worker so every pool process is included.
+CELERY_METRICS_PORT = config('CELERY_METRICS_PORT', default=0, cast=int)
+CELERY_BEAT_SCHEDULE = {
+    'purge-expired-idempotency-keys': {
+        'task': 'orders.tasks.purge_expired_idempotency_keys',
+        'schedule': 60 * 60,
+    },
+    'relay-outbox': {
+        'task': 'orders.tasks.relay_outbox',
+        'schedule': 30,
+    },
+    'purge-published-outbox-messages': {
+        'task': 'orders.tasks.purge_published_outbox_messages',
+        'schedule': 24 * 60 * 60,
+    },
+    'reconcile-sales-rollups': {
+        'task': 'orders.tasks.reconcile_sales_rollups',
+        'schedule': 60 * 60,
+    },
+    'archive-old-orders': {
+        'task': 'orders.tasks.archive_old_orders',
+        'schedule': 24 * 60 * 60,
+    },
+    'purge-expired-tokens': {
+        'task': 'accounts.tasks.purge_expired_tokens',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
+# Transactional outbox for Celery dispatch.
+# 'thread' publishes from a per-process background thread after commit,
+# 'inline' publishes in the on_commit hook, 'off' leaves it to the beat sweep.
+OUTBOX_RELAY_MODE = config('OUTBOX_RELAY_MODE', default='thread')
+OUTBOX_RELAY_WINDOW = config('OUTBOX_RELAY_WINDOW', default=0.05, cast=float)
+OUTBOX_RELAY_BATCH_SIZE = config('OUTBOX_RELAY_BATCH_SIZE', default=100, cast=int)
+OUTBOX_DEDUP_TTL = config('OUTBOX_DEDUP_TTL', default=24 * 60 * 60, cast=int)
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=7, cast=int)
+
+# Sales rollups behind the owner dashboard
+SALES_ROLLUP_BATCH_SIZE = config('SALES_ROLLUP_BATCH_SIZE', default=500, cast=int)
+SALES_DASHBOARD_MAX_DAYS = config('SALES_DASHBOARD_MAX_DAYS', default=366, cast=int)
+SALES_DASHBOARD_MAX_HOURS = config('SALES_DASHBOARD_MAX_HOURS', default=24 * 31, cast=int)
+
+# Rows fetched per server-side cursor round trip by the order export
+ORDER_EXPORT_CHUNK_SIZE = config('ORDER_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Upper bound on order ids accepted by one bulk status update
+ORDER_BULK_STATUS_MAX_ORDERS = config('ORDER_BULK_STATUS_MAX_ORDERS', default=1000, cast=int)
+
+# Delivered/cancelled orders older than this move to orders_archive
+ORDER_ARCHIVE_AFTER_DAYS = config('ORDER_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+ORDER_ARCHIVE_BATCH_SIZE = config('ORDER_ARCHIVE_BATCH_SIZE', default=1000, cast=int)
+
+# Server-Sent Events stream of order status changes (served by the ASGI app)
+ORDER_EVENTS_HEARTBEAT = config('ORDER_EVENTS_HEARTBEAT', default=15, cast=int)
+ORDER_EVENTS_MAX_STREAM_SECONDS = config('ORDER_EVENTS_MAX_STREAM_SECONDS', default=300, cast=int)
+ORDER_EVENTS_RETRY_MS = config('ORDER_EVENTS_RETRY_MS', default=3000, cast=int)
+ORDER_EVENTS_QUEUE_SIZE = config('ORDER_EVENTS_QUEUE_SIZE', default=100, cast=int)
+# How long a ticket browsers open the stream with stays valid, from when it
+# is issued and from the end of each stream opened with it
+ORDER_EVENTS_TICKET_TTL = config('ORDER_EVENTS_TICKET_TTL', default=30, cast=int)
+# Recent events kept per user for reconnects sending Last-Event-ID
+ORDER_EVENTS_BACKLOG_SIZE = config('ORDER_EVENTS_BACKLOG_SIZE', default=100, cast=int)
+ORDER_EVENTS_BACKLOG_TTL = config('ORDER_EVENTS_BACKLOG_TTL', default=60 * 60, cast=int)
+
+# Idempotency-Key handling for order creation and cart mutations
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=30, cast=int)
+IDEMPOTENCY_WAIT_TIMEOUT = config('IDEMPOTENCY_WAIT_TIMEOUT', default=10, cast=int)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -157,7 +279,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -170,8 +292,8 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'ecommerce_backend.throttling.AnonRateThrottle',
+        'ecommerce_backend.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
@@ -198,8 +320,65 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.TokenRefreshSerializer',
 }
 
+# Login attempts allowed per username within the sliding window (seconds)
+LOGIN_MAX_ATTEMPTS = config('LOGIN_MAX_ATTEMPTS', default=5, cast=int)
+LOGIN_ATTEMPT_WINDOW = config('LOGIN_ATTEMPT_WINDOW', default=15 * 60, cast=int)
+
+# API response compression (ecommerce_backend/compression.py); zstd and br
+# are offered when the zstandard and brotli packages are installed
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=5, cast=int)
+COMPRESSION_ZSTD_LEVEL = config('COMPRESSION_ZSTD_LEVEL', default=3, cast=int)
+# Compressed variants of cached responses, per encoding
+COMPRESSION_CACHE_SIZE = config('COMPRESSION_CACHE_SIZE', default=64, cast=int)
+COMPRESSION_CACHE_TTL = config('COMPRESSION_CACHE_TTL', default=24 * 60 * 60, cast=int)
+
+# Prometheus metrics, served to "Authorization: Bearer <METRICS_TOKEN>"; without a
+# token /metrics is only served with DEBUG on
+METRICS_PATH = '/metrics'
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Readiness snapshot refreshed by a background thread in each web process
+HEALTH_CHECK_INTERVAL = config('HEALTH_CHECK_INTERVAL', default=10, cast=int)
+HEALTH_CHECK_TIMEOUT = config('HEALTH_CHECK_TIMEOUT', default=2, cast=float)
+HEALTH_SNAPSHOT_MAX_AGE = config('HEALTH_SNAPSHOT_MAX_AGE', default=30, cast=int)
+
+# Password hashing for login, signup and password changes runs in a bounded
+# per-process pool; requests beyond workers + max pending get a 503
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=4, cast=int)
+PASSWORD_HASHING_MAX_PENDING = config('PASSWORD_HASHING_MAX_PENDING', default=16, cast=int)
+PASSWORD_HASHING_RETRY_AFTER = config('PASSWORD_HASHING_RETRY_AFTER', default=1, cast=int)
+
+# Where revoked refresh tokens are kept: 'redis' (keys expiring with the
+# token, Bloom filter per process) or 'db' (simplejwt's token_blacklist tables).
+# With 'redis', unexpired tokens blacklisted in the tables still count until
+# `purge_token_blacklist --all` has copied them into Redis.
+JWT_BLACKLIST_BACKEND = config('JWT_BLACKLIST_BACKEND', default='redis')
+JWT_REVOKED_FILTER_CAPACITY = config('JWT_REVOKED_FILTER_CAPACITY', default=100000, cast=int)
+JWT_REVOKED_FILTER_ERROR_RATE = config('JWT_REVOKED_FILTER_ERROR_RATE', default=0.001, cast=float)
+JWT_TOKEN_PURGE_BATCH_SIZE = config('JWT_TOKEN_PURGE_BATCH_SIZE', default=1000, cast=int)
+
+# Two-tier caches (ecommerce_backend/tiered_cache.py): a per-process LRU in
+# front of Redis. Changes are announced on CACHE_INVALIDATION_CHANNEL and
+# every process drops its copy; the local TTL bounds staleness should an
+# announcement be lost.
+CACHE_INVALIDATION_CHANNEL = 'cache_invalidation'
+TIERED_CACHE_SIZE = config('TIERED_CACHE_SIZE', default=1000, cast=int)
+TIERED_CACHE_LOCAL_TTL = config('TIERED_CACHE_LOCAL_TTL', default=60, cast=int)
+# get_or_compute: how long one process may hold a value's compute lock, and
+# how long the others wait for its result before computing it themselves
+CACHE_COMPUTE_LOCK_TIMEOUT = config('CACHE_COMPUTE_LOCK_TIMEOUT', default=30, cast=int)
+CACHE_COMPUTE_WAIT_TIMEOUT = config('CACHE_COMPUTE_WAIT_TIMEOUT', default=5, cast=float)
+
+# Users resolved by CachedJWTAuthentication, through a two-tier cache
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=10000, cast=int)
+AUTH_USER_CACHE_LOCAL_TTL = config('AUTH_USER_CACHE_LOCAL_TTL', default=60, cast=int)
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=300, cast=int)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS', 
@@ -215,11 +394,21 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=EMAIL_HOST_USER if EMAIL_HOST_USER else 'noreply@example.com')
-
-# Logging - Make log directory optional
-LOG_DIR = BASE_DIR / 'logs'
-if not LOG_DIR.exists():
-    LOG_DIR.mkdir(parents=True, exist_ok=True)
+# Maximum notifications the outbox relay merges into one send_order_emails batch
+ORDER_EMAIL_BATCH_SIZE = config('ORDER_EMAIL_BATCH_SIZE', default=50, cast=int)
+
+# Logging
+# Records are queued on the request thread and formatted and written by a
+# listener thread (ecommerce_backend/logs.py). LOG_FORMAT is 'json' or
+# 'verbose'; when more than LOG_QUEUE_SIZE records are waiting, new ones are
+# dropped and counted. LOG_SAMPLE_RATES keeps a share of the INFO records of
+# busy loggers, e.g. "cart.views=0.1,products.views=0.25".
+LOG_FORMAT = config('LOG_FORMAT', default='json')
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (item.split('=') for item in config('LOG_SAMPLE_RATES', default='', cast=Csv()))
+}
 
 LOGGING = {
     'version': 1,
@@ -229,12 +418,23 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'ecommerce_backend.logs.JSONFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'ecommerce_backend.logs.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
     },
     'handlers': {
         'console': {
             'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            '()': 'ecommerce_backend.logs.QueueingHandler',
+            'maxsize': LOG_QUEUE_SIZE,
+            'formatter': LOG_FORMAT,
+            'filters': ['sampling'],
         },
     },
     'root': {
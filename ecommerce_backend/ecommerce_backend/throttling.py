@@ -0,0 +1,151 @@
+from django.core.cache import cache, caches
+from rest_framework import throttling
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Sliding-window counter: one hash per client holding the current window's
+# start and count plus the previous window's count. The previous count is
+# weighted by how much of it still overlaps the sliding window. The clock is
+# Redis' own, so every web process agrees on window boundaries.
+#
+# KEYS[1] counter hash; ARGV[1] limit, ARGV[2] window in ms, ARGV[3] cost.
+# Returns {allowed (1/0), milliseconds until the next request would pass}.
+SLIDING_WINDOW = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local start = now - (now % window)
+
+local state = redis.call('HMGET', KEYS[1], 'start', 'count', 'previous')
+local stored_start = tonumber(state[1])
+local count = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+
+if stored_start ~= start then
+    if stored_start == start - window then
+        previous = count
+    else
+        previous = 0
+    end
+    count = 0
+end
+
+local elapsed = now - start
+local weighted = previous * (window - elapsed) / window + count
+
+if weighted + cost > limit then
+    local wait = window - elapsed
+    if count + cost <= limit and previous > 0 then
+        wait = math.ceil((window - elapsed) - (limit - count - cost) * window / previous)
+    end
+    return {0, wait}
+end
+
+redis.call('HSET', KEYS[1], 'start', start, 'count', count + cost, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, 0}
+"""
+
+_script = None
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection('default')
+
+
+def uses_redis():
+    from django_redis.cache import RedisCache
+
+    return isinstance(caches['default'], RedisCache)
+
+
+def hit(key, limit, period, cost=1):
+    """
+    Count one request against ``limit`` per ``period`` seconds for ``key``,
+    atomically and in one round trip. Returns ``(allowed, wait_seconds)``;
+    a denied request is not counted.
+    """
+    global _script
+
+    client = _redis()
+    if _script is None:
+        _script = client.register_script(SLIDING_WINDOW)
+
+    allowed, wait = _script(keys=[f'ratelimit:{key}'], args=[limit, period * 1000, cost], client=client)
+    return bool(allowed), wait / 1000
+
+
+def reset(key):
+    if uses_redis():
+        _redis().delete(f'ratelimit:{key}')
+    else:
+        cache.delete(f'ratelimit:{key}')
+
+
+def hit_or_fallback(key, limit, period):
+    """
+    ``hit`` on Redis, or a fixed-window ``cache.add``/``cache.incr`` counter
+    for other cache backends (local development and tests).
+    """
+    if uses_redis():
+        return hit(key, limit, period)
+
+    cache_key = f'ratelimit:{key}'
+    cache.add(cache_key, 0, period)
+    attempts = cache.incr(cache_key)
+    if attempts > limit:
+        cache.decr(cache_key)
+        return False, period
+    return True, 0
+
+
+class RedisThrottleMixin:
+    """
+    Replaces DRF's timestamp-history throttling with the Lua sliding-window
+    counter. Keys, scopes and rates are the parent throttle's. Falls back to
+    DRF's implementation when the cache is not Redis, and lets requests
+    through if Redis is unreachable.
+    """
+
+    def allow_request(self, request, view):
+        if not uses_redis():
+            return super().allow_request(request, view)
+
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, self._wait = hit(self.key, self.num_requests, self.duration)
+        except Exception as e:
+            logger.warning(f"Throttle check failed open: {e}")
+            return True
+
+        return allowed
+
+    def wait(self):
+        if not uses_redis():
+            return super().wait()
+        return math.ceil(self._wait)
+
+
+class AnonRateThrottle(RedisThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(RedisThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(RedisThrottleMixin, throttling.ScopedRateThrottle):
+    pass
@@ -0,0 +1,483 @@
+"""
+Two-tier cache: a bounded per-process LRU (L1) in front of the default
+Django cache (L2, Redis).
+
+Writes and deletes go to Redis and are announced on
+``CACHE_INVALIDATION_CHANNEL``; a subscriber thread in every process that
+uses a ``TieredCache`` drops the announced keys from its L1, so gunicorn
+and Celery processes stop serving a changed value within milliseconds.
+Filling a key after a miss changes nothing, so it is not announced. The
+L1 TTL bounds staleness should an announcement get lost, and L1 is
+bypassed while the subscriber is disconnected. With a non-Redis default
+cache (local development, benchmarks) there is nothing to subscribe to
+and L1 entries live for their TTL.
+
+``get_or_compute`` protects expensive values from stampedes: one process
+per key recomputes a missing value while the others wait for it (a lock
+taken with ``cache.add``); a fresh value is refreshed early with a
+probability that grows as it nears expiry (XFetch), and an expired one is
+served for up to ``stale_ttl`` more seconds while a background thread
+refreshes it.
+
+Hits and misses of each tier are counted in ``tiered_cache_requests_total``.
+"""
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from prometheus_client import Counter
+from .throttling import uses_redis
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = Counter(
+    'tiered_cache_requests_total', 'Two-tier cache lookups by tier and result', ['cache', 'tier', 'result'],
+)
+RECOMPUTES = Counter(
+    'tiered_cache_recomputes_total', 'Values recomputed by get_or_compute, by reason', ['cache', 'reason'],
+)
+
+# Identifies this process's own announcements, which it has already applied
+_origin = uuid.uuid4().hex
+
+_caches = {}
+
+
+def computing_key(key):
+    return f'{key}:computing'
+
+
+class LocalCache:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset(self):
+        # After a fork: the parent's lock may have been held mid-update
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+class Invalidations:
+    """Subscriber thread applying other processes' announcements to every L1."""
+
+    def __init__(self):
+        self.connected = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='cache-invalidations', daemon=True)
+                self._thread.start()
+
+    def publish(self, name, keys):
+        try:
+            from django_redis import get_redis_connection
+
+            get_redis_connection('default').publish(
+                settings.CACHE_INVALIDATION_CHANNEL,
+                json.dumps({'origin': _origin, 'cache': name, 'keys': list(keys)}),
+            )
+        except Exception as e:
+            # Other processes catch up when their L1 entries expire
+            logger.warning(f"Could not announce invalidation of {name} keys: {e}")
+
+    def _run(self):
+        import redis
+
+        while True:
+            client = redis.from_url(settings.REDIS_URL)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+
+            try:
+                pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                # Announcements may have been missed while disconnected
+                for tiered in list(_caches.values()):
+                    tiered.forget_all()
+                self.connected = True
+
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._apply(json.loads(message['data']))
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscription failed, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                self.connected = False
+                pubsub.close()
+                client.close()
+
+    def _apply(self, message):
+        tiered = _caches.get(message['cache'])
+        if tiered is not None and message['origin'] != _origin:
+            tiered.forget(message['keys'])
+
+    def reset(self):
+        self.connected = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+
+invalidations = Invalidations()
+
+
+class TieredCache:
+    """
+    ``get``/``set``/``delete`` through a per-process L1 and the default
+    cache. ``name`` labels the metrics and scopes announcements; keys are
+    stored in Redis unchanged, so existing keys keep working.
+
+    Redis errors are logged and treated as misses, as a cache outage must
+    not fail the request.
+    """
+
+    def __init__(self, name, timeout, max_size=None, local_ttl=None):
+        if name in _caches:
+            raise ValueError(f"A TieredCache named '{name}' already exists")
+
+        self.name = name
+        self.timeout = timeout
+        self.local = LocalCache(max_size or settings.TIERED_CACHE_SIZE, local_ttl or settings.TIERED_CACHE_LOCAL_TTL)
+        # Bumped by every invalidation, so a value read from Redis before a
+        # concurrent invalidation is not stored in L1 afterwards
+        self._generation = 0
+        _caches[name] = self
+
+    def _uses_l1(self):
+        if not uses_redis():
+            return True
+        invalidations.ensure_started()
+        return invalidations.connected
+
+    def _count(self, tier, hits, misses):
+        if hits:
+            REQUESTS.labels(self.name, tier, 'hit').inc(hits)
+        if misses:
+            REQUESTS.labels(self.name, tier, 'miss').inc(misses)
+
+    def _local_many(self, keys):
+        if not self._uses_l1():
+            return {}, None
+
+        generation = self._generation
+        found = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+        self._count('l1', len(found), len(keys) - len(found))
+        return found, generation
+
+    def _fill_local(self, values, generation):
+        if generation is not None and generation == self._generation:
+            for key, value in values.items():
+                self.local.set(key, value)
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Values found for ``keys``; missing keys are left out."""
+        found, generation = self._local_many(keys)
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+
+        try:
+            remote = cache.get_many(missing)
+        except Exception as e:
+            logger.warning(f"{self.name} cache read failed: {e}")
+            remote = {}
+
+        self._count('l2', len(remote), len(missing) - len(remote))
+        self._fill_local(remote, generation)
+        return {**found, **remote}
+
+    async def aget_many(self, keys):
+        found, generation = self._local_many(keys)
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+
+        try:
+            remote = await cache.aget_many(missing)
+        except Exception as e:
+            logger.warning(f"{self.name} cache read failed: {e}")
+            remote = {}
+
+        self._count('l2', len(remote), len(missing) - len(remote))
+        self._fill_local(remote, generation)
+        return {**found, **remote}
+
+    @property
+    def generation(self):
+        """Read before loading a missing value, for ``fill``."""
+        return self._generation
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, values, timeout=None):
+        """Store changed ``values`` in both tiers and have other processes drop their copies."""
+        generation = self.forget(values)
+        try:
+            cache.set_many(values, timeout or self.timeout)
+        except Exception as e:
+            logger.warning(f"{self.name} cache write failed: {e}")
+        self._announce(values)
+        self._fill_local(values, generation if self._uses_l1() else None)
+
+    def fill(self, key, value, generation):
+        self.fill_many({key: value}, generation)
+
+    def fill_many(self, values, generation, timeout=None):
+        """
+        Store ``values`` loaded after a miss. Other processes have nothing to
+        drop, so nothing is announced, and L1 only keeps them if no
+        invalidation came in after ``generation`` was read.
+        """
+        try:
+            cache.set_many(values, timeout or self.timeout)
+        except Exception as e:
+            logger.warning(f"{self.name} cache write failed: {e}")
+        self._fill_local(values, generation if self._uses_l1() else None)
+
+    async def aset_many(self, values):
+        await sync_to_async(self.set_many)(values)
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        self.forget(keys)
+        try:
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.warning(f"{self.name} cache invalidation failed: {e}")
+        self._announce(keys)
+
+    def get_or_compute(self, key, compute, stale_ttl=None, beta=1.0):
+        """The value for ``key``, calling ``compute()`` when it has to be (re)built."""
+        return self.get_or_compute_many([key], lambda keys: {key: compute()}, stale_ttl, beta)[key]
+
+    def get_or_compute_many(self, keys, compute_many, stale_ttl=None, beta=1.0):
+        """
+        Values for ``keys``. ``compute_many(keys)`` returns a dict with a
+        value for each of the keys it is given, in one go (e.g. one grouped
+        query). Values are fresh for ``timeout`` seconds and may be served
+        ``stale_ttl`` seconds longer (default: ``timeout``) while they are
+        refreshed in the background. ``beta`` > 1 favours earlier refreshes.
+        """
+        values, missing, refresh = self._classify(self.get_many(keys), keys, beta)
+
+        if missing:
+            values.update(self._compute_missing(missing, compute_many, stale_ttl))
+        if refresh:
+            self._refresh_in_background(refresh, compute_many, stale_ttl)
+        return values
+
+    async def aget_or_compute_many(self, keys, compute_many, stale_ttl=None, beta=1.0):
+        # Values served from the cache need no thread; computing them does
+        values, missing, refresh = self._classify(await self.aget_many(keys), keys, beta)
+
+        if missing:
+            values.update(await sync_to_async(self._compute_missing)(missing, compute_many, stale_ttl))
+        if refresh:
+            await sync_to_async(self._refresh_in_background)(refresh, compute_many, stale_ttl)
+        return values
+
+    def _classify(self, entries, keys, beta):
+        """
+        Split cached entries into usable values, keys to compute now, and
+        keys to refresh ({key: reason}).
+        """
+        now = time.time()
+        values, missing, refresh = {}, [], {}
+
+        for key in keys:
+            entry = entries.get(key)
+            # Values cached before get_or_compute was used have no envelope
+            if not isinstance(entry, tuple) or len(entry) != 3:
+                missing.append(key)
+                continue
+
+            value, delta, fresh_until = entry
+            values[key] = value
+            if now >= fresh_until:
+                refresh[key] = 'stale'
+            elif now - delta * beta * math.log(1 - random.random()) >= fresh_until:
+                # XFetch: the slower the computation and the closer the expiry,
+                # the likelier this request refreshes the value ahead of time
+                refresh[key] = 'early'
+
+        return values, missing, refresh
+
+    def _compute(self, keys, compute_many, stale_ttl, refresh=False):
+        """Compute and store ``keys``; only a ``refresh`` replaces values other processes may hold."""
+        generation = self._generation
+        started = time.time()
+        computed = compute_many(keys)
+        delta = time.time() - started
+
+        fresh_until = time.time() + self.timeout
+        stale_ttl = self.timeout if stale_ttl is None else stale_ttl
+        entries = {key: (value, delta, fresh_until) for key, value in computed.items()}
+        if refresh:
+            self.set_many(entries, self.timeout + stale_ttl)
+        else:
+            self.fill_many(entries, generation, self.timeout + stale_ttl)
+        return computed
+
+    def _lock(self, key):
+        """A release callable if this process may compute ``key``, or ``None`` if another one is."""
+        lock_key = computing_key(key)
+        token = uuid.uuid4().hex
+
+        try:
+            if not cache.add(lock_key, token, settings.CACHE_COMPUTE_LOCK_TIMEOUT):
+                return None
+        except Exception as e:
+            # Nobody can coordinate without the cache; compute locally
+            logger.warning(f"{self.name} compute lock failed: {e}")
+            return lambda: None
+
+        def release():
+            try:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"{self.name} compute lock release failed: {e}")
+
+        return release
+
+    def _compute_missing(self, keys, compute_many, stale_ttl):
+        locks = {key: self._lock(key) for key in keys}
+        mine = [key for key, release in locks.items() if release is not None]
+        values = {}
+
+        try:
+            if mine:
+                RECOMPUTES.labels(self.name, 'missing').inc(len(mine))
+                values.update(self._compute(mine, compute_many, stale_ttl))
+        finally:
+            for key in mine:
+                locks[key]()
+
+        # Wait for the processes computing the rest, straight from Redis
+        waiting = [key for key in keys if key not in values]
+        deadline = time.monotonic() + settings.CACHE_COMPUTE_WAIT_TIMEOUT
+        while waiting and time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                entries = cache.get_many(waiting + [computing_key(key) for key in waiting])
+            except Exception:
+                break
+
+            for key in waiting:
+                entry = entries.get(key)
+                if isinstance(entry, tuple) and len(entry) == 3:
+                    values[key] = entry[0]
+            # A released lock without a value means that computation failed
+            waiting = [key for key in waiting if key not in values and computing_key(key) in entries]
+
+        left = [key for key in keys if key not in values]
+        if left:
+            RECOMPUTES.labels(self.name, 'wait_failed').inc(len(left))
+            values.update(self._compute(left, compute_many, stale_ttl))
+        return values
+
+    def _refresh_in_background(self, reasons, compute_many, stale_ttl):
+        locks = {key: self._lock(key) for key in reasons}
+        mine = [key for key, release in locks.items() if release is not None]
+        if not mine:
+            return
+
+        for key in mine:
+            RECOMPUTES.labels(self.name, reasons[key]).inc()
+
+        def refresh():
+            try:
+                self._compute(mine, compute_many, stale_ttl, refresh=True)
+            except Exception as e:
+                logger.error(f"{self.name} background refresh failed: {e}")
+            finally:
+                for key in mine:
+                    locks[key]()
+                connections.close_all()  # This thread's connections only
+
+        threading.Thread(target=refresh, name=f'{self.name}-refresh', daemon=True).start()
+
+    def forget(self, keys):
+        """Drop ``keys`` from this process's L1 only; returns the new generation."""
+        self._generation += 1
+        for key in keys:
+            self.local.delete(key)
+        return self._generation
+
+    def forget_all(self):
+        self._generation += 1
+        self.local.clear()
+
+    def _announce(self, keys):
+        if uses_redis():
+            invalidations.publish(self.name, keys)
+
+
+def _reset_in_child():
+    # The subscriber thread does not survive a fork, and the child must not
+    # serve L1 entries whose invalidations it would miss until it resubscribes
+    invalidations.reset()
+    for tiered in _caches.values():
+        tiered.local.reset()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
@@ -1,23 +1,9 @@
 from django.contrib import admin
-from django.urls import path, include, re_path
+from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="E-commerce API",
-        default_version='v1',
-        description="Production-ready E-commerce Backend API",
-        terms_of_service="https://www.yourapp.com/terms/",
-        contact=openapi.Contact(email="contact@yourapp.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from .metrics import metrics_view
+from .views import api_schema
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -26,15 +12,21 @@ urlpatterns = [
     path('api/cart/', include('cart.urls')),
     path('api/orders/', include('orders.urls')),
     
-    # API Documentation
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    # Async read-only catalog for the ASGI process
+    path('api/catalog/', include('products.catalog_urls')),
+    
+    # Prebuilt OpenAPI schema (see the build_api_schema command)
+    path('swagger.json', api_schema, name='schema-json'),
     
     # Health check
     path('health/', include('accounts.health_urls')),
+    
+    path(settings.METRICS_PATH.lstrip('/'), metrics_view, name='metrics'),
 ]
 
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [path('', include('ecommerce_backend.docs'))]
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -1,4 +1,10 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag
+from functools import lru_cache
+from pathlib import Path
+import hashlib
 
 def custom_404(request, exception):
     return JsonResponse({
@@ -12,4 +18,25 @@ def custom_500(request):
         'error': True,
         'message': 'Internal server error',
         'status_code': 500
-    }, status=500)
\ No newline at end of file
+    }, status=500)
+
+@lru_cache(maxsize=None)
+def _schema():
+    """The schema artifact, read once per process and built in place if missing."""
+    path = Path(settings.API_SCHEMA_PATH)
+    if not path.exists():
+        from django.core.management import call_command
+        call_command('build_api_schema', verbosity=0)
+
+    content = path.read_bytes()
+    return content, '"%s"' % hashlib.md5(content).hexdigest()
+
+
+@etag(lambda request: _schema()[1])
+def api_schema(request):
+    content, etag_value = _schema()
+    response = HttpResponse(content, content_type='application/json')
+    patch_cache_control(response, public=True, max_age=settings.API_SCHEMA_MAX_AGE)
+    # Compressed once per encoding and schema version (see CompressionMiddleware)
+    response.compression_cache_key = 'api_schema:' + etag_value.strip('"')
+    return response
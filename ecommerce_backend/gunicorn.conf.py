@@ -0,0 +1,27 @@
+# Shared by the `web` (WSGI) and `asgi` processes in the Procfile. The ASGI
+# process runs uvicorn workers and serves the order event streams and the
+# async catalog under /api/catalog/; route those paths to it.
+# Workers write Prometheus samples to PROMETHEUS_MULTIPROC_DIR so /metrics
+# on any worker reports every worker of that server. Each server needs a
+# directory of its own (the Procfile sets one per process type): the
+# master empties it on start. Without one, the master's pid keeps them apart.
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'prometheus_multiproc_{os.getpid()}')
+)
+
+
+def on_starting(server):
+    # Samples from a previous run would be merged into the new one
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,25 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import Order, OrderItem
+from . import bulk, emails, events, outbox, rollups
+
+def mark_status_action(new_status, label):
+    def mark_status(modeladmin, request, queryset):
+        order_ids = list(queryset.values_list('id', flat=True))
+        results = bulk.bulk_update_status(order_ids, new_status)
+        updated = sum(1 for result in results if result['result'] == bulk.UPDATED)
+        skipped = len(results) - updated
+        
+        modeladmin.message_user(request, f'{updated} orders marked as {label.lower()}.')
+        if skipped:
+            modeladmin.message_user(
+                request,
+                f'{skipped} orders skipped (already {label.lower()} or transition not allowed).',
+                messages.WARNING
+            )
+    
+    mark_status.__name__ = f'mark_{new_status}'
+    mark_status.short_description = f'Mark selected orders as {label.lower()}'
+    return mark_status
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -15,6 +35,11 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ('order_number', 'user__username', 'user__email', 'phone')
     readonly_fields = ('order_number', 'total_amount', 'email_sent', 'created_at', 'updated_at')
     inlines = [OrderItemInline]
+    actions = [
+        mark_status_action(value, label)
+        for value, label in Order.STATUS_CHOICES
+        if value != 'pending'
+    ]
     
     fieldsets = (
         ('Order Information', {
@@ -34,9 +59,15 @@ class OrderAdmin(admin.ModelAdmin):
     
     def save_model(self, request, obj, form, change):
         if change and 'status' in form.changed_data:
-            from .tasks import send_order_status_update_email
-            old_status = Order.objects.get(pk=obj.pk).get_status_display()
+            from .tasks import send_order_emails
+            old_order = Order.objects.get(pk=obj.pk)
+            old_status = old_order.get_status_display()
             super().save_model(request, obj, form, change)
-            send_order_status_update_email.delay(obj.id, old_status, obj.get_status_display())
+            rollups.status_changed(obj.id, old_order.status, obj.status)
+            # changeform_view runs inside a transaction, so this is sent after commit
+            outbox.enqueue(send_order_emails, [emails.status_update(obj.id, old_status, obj.get_status_display())])
+            events.publish_on_commit([
+                events.order_event('order_status', obj.id, obj.order_number, obj.user_id, obj.status, old_order.status)
+            ])
         else:
             super().save_model(request, obj, form, change)
\ No newline at end of file
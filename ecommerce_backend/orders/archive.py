@@ -0,0 +1,195 @@
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+ORDER_FIELDS = (
+    'id', 'order_number', 'user_id', 'status', 'payment_method', 'total_amount',
+    'shipping_address', 'phone', 'notes', 'email_sent', 'item_count', 'thumbnail',
+    'created_at', 'updated_at',
+)
+ITEM_FIELDS = ('id', 'order_id', 'product_id', 'product_name', 'quantity', 'price', 'subtotal')
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+
+
+def archive_orders(cutoff=None, batch_size=None, max_batches=None):
+    """
+    Move delivered and cancelled orders created before ``cutoff`` (and their
+    items) into the archive tables.
+
+    Each batch is copied and deleted in its own transaction, with the source
+    rows locked ``SKIP LOCKED`` so archiving never waits on checkout or
+    status updates. Returns the number of orders moved.
+    """
+    from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+    cutoff = cutoff or default_cutoff()
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    archived = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+                .order_by('id')
+                .values(*ORDER_FIELDS)[:batch_size]
+            )
+
+            if not orders:
+                break
+
+            order_ids = [order['id'] for order in orders]
+            created_at = {order['id']: order['created_at'] for order in orders}
+            items = OrderItem.objects.filter(order_id__in=order_ids).values(*ITEM_FIELDS)
+
+            ArchivedOrder.objects.bulk_create([ArchivedOrder(**order) for order in orders])
+            ArchivedOrderItem.objects.bulk_create([
+                ArchivedOrderItem(order_created_at=created_at[item['order_id']], **item)
+                for item in items
+            ], batch_size=1000)
+
+            OrderItem.objects.filter(order_id__in=order_ids).delete()
+            Order.objects.filter(id__in=order_ids).delete()
+
+        archived += len(orders)
+        batches += 1
+        logger.info(f"Archived {len(orders)} orders (total {archived})")
+
+        if len(orders) < batch_size:
+            break
+
+    return archived
+
+
+def is_partitioned(table):
+    if connection.vendor != 'postgresql':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+# (table, partition key column)
+PARTITIONED_TABLES = (
+    ('orders_archive', 'created_at'),
+    ('order_items_archive', 'order_created_at'),
+)
+
+
+def partition_archive_tables(months_ahead=3):
+    """
+    Convert the archive tables to ``PARTITION BY RANGE`` on their creation
+    timestamp with one partition per month (plus a default partition),
+    moving existing rows across. Safe to re-run; already partitioned tables
+    only get their future partitions created. Returns ``False`` without
+    doing anything unless the database is PostgreSQL.
+    """
+    if connection.vendor != 'postgresql':
+        logger.warning(f"Archive partitioning requires PostgreSQL, not {connection.vendor}")
+        return False
+
+    for table, column in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            _convert_to_partitioned(table, column, months_ahead)
+        else:
+            ensure_partitions(table, _first_of_month(timezone.now().date()), months_ahead)
+    return True
+
+
+def ensure_archive_partitions(months_ahead=3):
+    """Create upcoming monthly partitions for any archive table that is partitioned."""
+    for table, _ in PARTITIONED_TABLES:
+        if is_partitioned(table):
+            ensure_partitions(table, _first_of_month(timezone.now().date()), months_ahead)
+
+
+def _convert_to_partitioned(table, column, months_ahead):
+    """
+    Build a partitioned copy of ``table``, move the rows into it and swap it
+    in, all in one transaction. ``LIKE`` copies neither foreign keys nor
+    indexes, so both are read from the catalog first and recreated on the
+    new table once the old one is dropped.
+    """
+    staging = f'{table}_partitioned'
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT min({column}) FROM {table}')
+        earliest = cursor.fetchone()[0] or timezone.now()
+
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        # The primary key is replaced by one including the partition key
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+            [table, table],
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(
+            f'CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ({column})'
+        )
+        cursor.execute(f'ALTER TABLE {staging} ADD PRIMARY KEY (id, {column})')
+        cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {staging} DEFAULT')
+        ensure_partitions(
+            staging, _first_of_month(earliest.date()), months_ahead, cursor=cursor, prefix=table
+        )
+
+        cursor.execute(f'INSERT INTO {staging} SELECT * FROM {table}')
+        # Dropping the old table frees its index names for the new one
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {staging} RENAME TO {table}')
+
+        for definition in index_definitions:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+    logger.info(f"Converted {table} to a range partitioned table")
+
+
+def ensure_partitions(table, first_month, months_ahead, cursor=None, prefix=None):
+    if cursor is None:
+        with connection.cursor() as cursor:
+            return ensure_partitions(table, first_month, months_ahead, cursor, prefix)
+
+    prefix = prefix or table
+    month = first_month
+    last = _add_months(_first_of_month(timezone.now().date()), months_ahead)
+
+    while month <= last:
+        following = _add_months(month, 1)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {prefix}_y{month:%Y}m{month:%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+
+
+def _first_of_month(day):
+    return date(day.year, day.month, 1)
+
+
+def _add_months(day, months):
+    month_index = day.month - 1 + months
+    return date(day.year + month_index // 12, month_index % 12 + 1, 1)
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.utils import timezone
+from . import emails, events, outbox, rollups
+from .models import Order
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+INVALID_TRANSITION = 'invalid_transition'
+
+
+def bulk_update_status(order_ids, new_status, queryset=None):
+    """
+    Move many orders to ``new_status`` in one transaction.
+
+    Current statuses are read with one locked SELECT, every order is checked
+    against ``Order.STATUS_TRANSITIONS``, and the valid ones are changed with
+    a single UPDATE. Rollup events and status emails for the whole set are
+    queued as one outbox message each, and the owners' event streams get
+    one pipelined publish after commit. Returns a compact result per
+    requested id.
+    """
+    from .tasks import send_bulk_order_emails, update_sales_rollups
+
+    queryset = Order.objects.all() if queryset is None else queryset
+    status_labels = dict(Order.STATUS_CHOICES)
+    results = []
+    moves = []
+
+    with transaction.atomic():
+        current = {
+            order_id: (order_status, order_number, user_id)
+            for order_id, order_status, order_number, user_id in (
+                queryset.select_for_update()
+                .filter(id__in=order_ids)
+                .values_list('id', 'status', 'order_number', 'user_id')
+            )
+        }
+
+        for order_id in dict.fromkeys(order_ids):
+            old_status, order_number, user_id = current.get(order_id, (None, None, None))
+
+            if old_status is None:
+                results.append({'id': order_id, 'result': NOT_FOUND})
+            elif old_status == new_status:
+                results.append({'id': order_id, 'result': UNCHANGED, 'status': old_status})
+            elif new_status not in Order.STATUS_TRANSITIONS[old_status]:
+                results.append({'id': order_id, 'result': INVALID_TRANSITION, 'status': old_status})
+            else:
+                results.append({'id': order_id, 'result': UPDATED, 'status': new_status})
+                moves.append((order_id, old_status, order_number, user_id))
+
+        if moves:
+            Order.objects.filter(id__in=[move[0] for move in moves]).update(
+                status=new_status, updated_at=timezone.now()
+            )
+
+            outbox.enqueue(update_sales_rollups, [
+                rollups.status_event(order_id, old_status, new_status)
+                for order_id, old_status, _, _ in moves
+            ])
+            outbox.enqueue(send_bulk_order_emails, [
+                emails.status_update(order_id, status_labels[old_status], status_labels[new_status])
+                for order_id, old_status, _, _ in moves
+            ])
+            events.publish_on_commit([
+                events.order_event('order_status', order_id, order_number, user_id, new_status, old_status)
+                for order_id, old_status, order_number, user_id in moves
+            ])
+
+    logger.info(f"Bulk status update to {new_status}: {len(moves)} of {len(results)} orders updated")
+    return results
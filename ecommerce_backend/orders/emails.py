@@ -0,0 +1,112 @@
+from functools import lru_cache
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONFIRMATION = 'confirmation'
+STATUS_UPDATE = 'status_update'
+
+TEMPLATES = {
+    CONFIRMATION: 'orders/emails/order_confirmation.txt',
+    STATUS_UPDATE: 'orders/emails/order_status_update.txt',
+}
+
+SUBJECTS = {
+    CONFIRMATION: 'Order Confirmation - Order #{order_number}',
+    STATUS_UPDATE: 'Order Status Update - Order #{order_number}',
+}
+
+
+def confirmation(order_id):
+    return {'type': CONFIRMATION, 'order_id': order_id}
+
+
+def status_update(order_id, old_status, new_status):
+    return {
+        'type': STATUS_UPDATE,
+        'order_id': order_id,
+        'old_status': old_status,
+        'new_status': new_status,
+    }
+
+
+@lru_cache(maxsize=None)
+def _template(notification_type):
+    # Compiled once per process instead of once per message
+    return get_template(TEMPLATES[notification_type])
+
+
+def render(notification, order):
+    notification_type = notification['type']
+    context = {
+        'order': order,
+        'old_status': notification.get('old_status'),
+        'new_status': notification.get('new_status'),
+    }
+
+    return EmailMessage(
+        subject=SUBJECTS[notification_type].format(order_number=order.order_number),
+        body=_template(notification_type).render(context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[order.user.email],
+    )
+
+
+def deliver(notifications):
+    """
+    Render and send a batch of order notifications over one mail connection.
+
+    Orders are loaded with a single query, confirmations for orders that
+    already have ``email_sent`` are skipped, and ``email_sent`` is set for
+    every delivered confirmation with one UPDATE. Returns the notifications
+    that failed to send so the caller can retry just those.
+    """
+    from .models import Order
+
+    order_ids = {n['order_id'] for n in notifications}
+    orders = (
+        Order.objects.select_related('user')
+        .prefetch_related('items')
+        .in_bulk(order_ids)
+    )
+
+    pending = []
+    for notification in notifications:
+        order = orders.get(notification['order_id'])
+
+        if order is None:
+            logger.error(f"Order {notification['order_id']} not found")
+            continue
+
+        if notification['type'] == CONFIRMATION and order.email_sent:
+            continue
+
+        pending.append((notification, render(notification, order)))
+
+    if not pending:
+        return []
+
+    failed = []
+    confirmed_ids = []
+    connection = get_connection(fail_silently=False)
+
+    with connection:
+        for notification, message in pending:
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                logger.error(f"Error sending {notification['type']} email for order {notification['order_id']}: {e}")
+                failed.append(notification)
+                continue
+
+            if notification['type'] == CONFIRMATION:
+                confirmed_ids.append(notification['order_id'])
+
+    if confirmed_ids:
+        Order.objects.filter(id__in=confirmed_ids).update(email_sent=True)
+
+    logger.info(f"Sent {len(pending) - len(failed)} order emails, {len(failed)} failed")
+    return failed
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'order_events'
+BACKLOG_PREFIX = 'order_events_backlog'
+
+
+def channel(user_id):
+    return f'{CHANNEL_PREFIX}:{user_id}'
+
+
+def backlog_key(user_id):
+    return f'{BACKLOG_PREFIX}:{user_id}'
+
+
+def event_id_order(event_id):
+    """A Redis stream entry id (``<ms>-<seq>``) as a comparable tuple, or ``None`` if malformed."""
+    ms, _, seq = (event_id or '').partition('-')
+    if not (ms.isdigit() and seq.isdigit()):
+        return None
+    return int(ms), int(seq)
+
+
+def order_event(event_type, order_id, order_number, user_id, status, previous_status=None):
+    return {
+        'type': event_type,
+        'user_id': user_id,
+        'order': {
+            'id': order_id,
+            'order_number': str(order_number),
+            'status': status,
+            'previous_status': previous_status,
+        },
+    }
+
+
+def publish_on_commit(events):
+    """Publish order events to their owners' channels once the transaction commits."""
+    if events:
+        transaction.on_commit(lambda: publish(events))
+
+
+def publish(events):
+    """
+    Append each event to its owner's backlog (a Redis stream, whose entry id
+    becomes the SSE event id) and publish it. Best effort: a Redis outage
+    must never fail the request that changed the order.
+    """
+    try:
+        from django_redis import get_redis_connection
+
+        client = get_redis_connection('default')
+        payloads = [json.dumps(event, cls=DjangoJSONEncoder) for event in events]
+
+        pipe = client.pipeline(transaction=False)
+        for event, payload in zip(events, payloads):
+            key = backlog_key(event['user_id'])
+            pipe.xadd(key, {'data': payload}, maxlen=settings.ORDER_EVENTS_BACKLOG_SIZE, approximate=True)
+            pipe.expire(key, settings.ORDER_EVENTS_BACKLOG_TTL)
+        event_ids = pipe.execute()[::2]
+
+        pipe = client.pipeline(transaction=False)
+        for event, payload, event_id in zip(events, payloads, event_ids):
+            pipe.publish(channel(event['user_id']), json.dumps({'id': event_id.decode(), 'data': payload}))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not publish {len(events)} order events: {e}")
+
+
+async def backlog(user_id, after):
+    """``(event id, data)`` of ``user_id``'s events logged after ``after``, oldest first."""
+    import redis.asyncio as redis
+
+    client = redis.from_url(settings.REDIS_URL)
+    try:
+        entries = await client.xrange(backlog_key(user_id), min=after, count=settings.ORDER_EVENTS_BACKLOG_SIZE)
+    finally:
+        await client.close()
+
+    return [
+        (entry_id.decode(), fields[b'data'].decode())
+        for entry_id, fields in entries
+        if entry_id.decode() != after
+    ]
+
+
+class OrderEventHub:
+    """
+    Fans order events out to the SSE connections of one worker process.
+
+    A single pattern subscription on ``order_events:*`` is shared by every
+    open stream in the process, so idle connections cost an asyncio queue
+    each instead of a Redis connection or a thread.
+    """
+
+    def __init__(self):
+        self._listeners = {}
+        self._task = None
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=settings.ORDER_EVENTS_QUEUE_SIZE)
+        self._listeners.setdefault(str(user_id), set()).add(queue)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._listeners.get(str(user_id))
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._listeners[str(user_id)]
+
+    async def _listen(self):
+        import redis.asyncio as redis
+
+        while self._listeners:
+            client = redis.from_url(settings.REDIS_URL)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+
+            try:
+                await pubsub.psubscribe(f'{CHANNEL_PREFIX}:*')
+
+                while self._listeners:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._dispatch(message)
+            except Exception as e:
+                logger.warning(f"Order event subscription failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+                await client.close()
+
+    def _dispatch(self, message):
+        user_id = message['channel'].decode().rsplit(':', 1)[1]
+
+        for queue in self._listeners.get(user_id, ()):
+            if queue.full():
+                # Slow client: drop the oldest event rather than block the hub
+                queue.get_nowait()
+            queue.put_nowait(message['data'].decode())
+
+
+_hubs = {}
+
+
+def get_hub():
+    """The hub for the running event loop (one per ASGI worker)."""
+    loop = asyncio.get_running_loop()
+
+    # Forget the hubs of loops that have since been closed
+    for closed in [other for other in _hubs if other.is_closed()]:
+        del _hubs[closed]
+
+    hub = _hubs.get(loop)
+
+    if hub is None:
+        hub = _hubs[loop] = OrderEventHub()
+
+    return hub
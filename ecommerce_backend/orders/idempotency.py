@@ -0,0 +1,222 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _scope_digest(request, key):
+    scope = f'{request.user.pk}:{request.method}:{request.path}:{key}'
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _fingerprint(request):
+    payload = json.dumps(
+        {'data': request.data, 'query': request.query_params},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_key(digest):
+    return f'idempotency_{digest}'
+
+
+def _lock_key(digest):
+    return f'idempotency_lock_{digest}'
+
+
+def _load(digest):
+    """Return the stored ``(fingerprint, status_code, body)`` for a key, if any."""
+    from .models import IdempotencyKey
+
+    try:
+        stored = cache.get(_cache_key(digest))
+        if stored is not None:
+            return stored
+    except Exception as e:
+        logger.warning(f"Idempotency cache lookup failed: {e}")
+
+    record = IdempotencyKey.objects.filter(
+        key=digest,
+        status_code__isnull=False,
+        expires_at__gt=timezone.now(),
+    ).first()
+
+    if record is None:
+        return None
+
+    stored = (record.request_fingerprint, record.status_code, record.response_body)
+    _cache_set(_cache_key(digest), stored, settings.IDEMPOTENCY_KEY_TTL)
+    return stored
+
+
+def _cache_set(key, value, timeout):
+    try:
+        cache.set(key, value, timeout)
+    except Exception as e:
+        logger.warning(f"Idempotency cache write failed: {e}")
+
+
+def _store(digest, request, fingerprint, response):
+    from .models import IdempotencyKey
+
+    ttl = settings.IDEMPOTENCY_KEY_TTL
+    IdempotencyKey.objects.update_or_create(
+        key=digest,
+        defaults={
+            'user': request.user,
+            'request_fingerprint': fingerprint,
+            'status_code': response.status_code,
+            'response_body': response.data,
+            'expires_at': timezone.now() + timedelta(seconds=ttl),
+        },
+    )
+    _cache_set(_cache_key(digest), (fingerprint, response.status_code, response.data), ttl)
+
+
+def _acquire(digest, request, fingerprint):
+    """
+    Take the in-flight lock for a key. Returns a release callable, or ``None``
+    if another request currently holds the lock.
+
+    Redis ``SET NX`` is used when the cache is reachable; otherwise an
+    in-progress row in ``idempotency_keys`` acts as the lock.
+    """
+    from .models import IdempotencyKey
+
+    token = uuid.uuid4().hex
+    lock_key = _lock_key(digest)
+
+    try:
+        if not cache.add(lock_key, token, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            return None
+
+        def release(stored):
+            try:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+            except Exception as e:
+                logger.warning(f"Idempotency lock release failed: {e}")
+
+        return release
+    except Exception as e:
+        logger.warning(f"Idempotency cache lock failed, falling back to database: {e}")
+
+    IdempotencyKey.objects.filter(key=digest, expires_at__lte=timezone.now()).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                key=digest,
+                user=request.user,
+                request_fingerprint=fingerprint,
+                expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT),
+            )
+    except IntegrityError:
+        return None
+
+    def release(stored):
+        if not stored:
+            IdempotencyKey.objects.filter(key=digest, status_code__isnull=True).delete()
+
+    return release
+
+
+def _wait_for(digest):
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        stored = _load(digest)
+        if stored is not None:
+            return stored
+    return None
+
+
+def _replay(stored, fingerprint):
+    stored_fingerprint, status_code, body = stored
+
+    if stored_fingerprint != fingerprint:
+        return Response(
+            {'error': True, 'message': 'Idempotency-Key was already used with a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+
+    response = Response(body, status=status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    Make a viewset method safe to retry with an ``Idempotency-Key`` header.
+
+    The first response for a key (per user, method and path) is stored in the
+    cache and in ``idempotency_keys``; retries replay it without running the
+    view again. A retry that arrives while the original request is still in
+    flight waits for its result instead of executing concurrently. Requests
+    without the header are passed straight through.
+    """
+    @functools.wraps(view_method)
+    def wrapper(viewset, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+
+        if not key:
+            return view_method(viewset, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': True, 'message': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        digest = _scope_digest(request, key)
+        fingerprint = _fingerprint(request)
+
+        stored = _load(digest)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        release = _acquire(digest, request, fingerprint)
+        if release is None:
+            stored = _wait_for(digest)
+            if stored is None:
+                return Response(
+                    {'error': True, 'message': 'A request with this Idempotency-Key is still in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return _replay(stored, fingerprint)
+
+        stored = False
+        try:
+            previous = _load(digest)
+            if previous is not None:
+                return _replay(previous, fingerprint)
+
+            response = view_method(viewset, request, *args, **kwargs)
+
+            # Server errors are not cached so the client can retry them
+            if response.status_code < 500:
+                _store(digest, request, fingerprint, response)
+                stored = True
+
+            return response
+        finally:
+            release(stored)
+
+    return wrapper
@@ -0,0 +1,34 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from orders import archive
+
+
+class Command(BaseCommand):
+    help = 'Move old delivered and cancelled orders into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='Archive orders created more than this many days ago'
+        )
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument(
+            '--partition', action='store_true',
+            help='PostgreSQL only: range partition the archive tables by month before archiving'
+        )
+        parser.add_argument('--months-ahead', type=int, default=3, help='Future monthly partitions to create')
+
+    def handle(self, *args, **options):
+        if options['partition']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--partition requires PostgreSQL')
+            archive.partition_archive_tables(options['months_ahead'])
+            self.stdout.write('Archive tables are range partitioned by month')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archived = archive.archive_orders(cutoff, options['batch_size'], options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders created before {cutoff:%Y-%m-%d}'))
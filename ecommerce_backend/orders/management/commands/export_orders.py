@@ -0,0 +1,41 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from orders import export
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Stream orders and their line items as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='output', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument(
+            '--status', action='append', choices=[value for value, _ in Order.STATUS_CHOICES],
+            help='Only export orders with this status; may be repeated'
+        )
+        parser.add_argument('--output-file', help='Write to this path instead of stdout')
+
+    def handle(self, *args, **options):
+        start = self._date(options['start'], '--start')
+        end = self._date(options['end'], '--end')
+        rows = export.export_rows(start, end, options['status'])
+
+        stream = open(options['output_file'], 'w', newline='') if options['output_file'] else sys.stdout
+        try:
+            for chunk in export.render(rows, options['output']):
+                stream.write(chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+    def _date(self, value, flag):
+        if value is None:
+            return None
+
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f'{flag} must be a date in YYYY-MM-DD format')
+        return parsed
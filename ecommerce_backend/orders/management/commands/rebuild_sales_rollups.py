@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute hourly and daily sales rollups from the orders tables and their archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='How many days of history to rebuild')
+        parser.add_argument(
+            '--include-current', action='store_true',
+            help='Also rebuild the current hour and day (only safe while no orders are being placed)'
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        until = timezone.now() + timedelta(days=1) if options['include_current'] else None
+        rebuilt = rollups.rebuild(since, until)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} rollup rows since {since:%Y-%m-%d %H:%M}'))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:47
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_summary_columns(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+
+    for order in Order.objects.only('id').iterator(chunk_size=1000):
+        items = OrderItem.objects.filter(order_id=order.id).select_related('product').order_by('id')
+        first = items.first()
+        Order.objects.filter(id=order.id).update(
+            item_count=items.aggregate(total=Sum('quantity'))['total'] or 0,
+            thumbnail=first.product.image.name if first and first.product.image else '',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='thumbnail',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='orders_user_created_idx'),
+        ),
+        migrations.RunPython(backfill_summary_columns, migrations.RunPython.noop),
+    ]
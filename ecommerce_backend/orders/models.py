@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from products.models import Product
 import uuid
@@ -13,6 +14,16 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     )
     
+    # Allowed moves for bulk_update_status; single-order updates (API and
+    # admin) may move an order anywhere, to correct mistakes
+    STATUS_TRANSITIONS = {
+        'pending': ('processing', 'shipped', 'cancelled'),
+        'processing': ('shipped', 'cancelled'),
+        'shipped': ('delivered',),
+        'delivered': (),
+        'cancelled': (),
+    }
+    
     PAYMENT_CHOICES = (
         ('cod', 'Cash on Delivery'),
         ('card', 'Credit/Debit Card'),
@@ -42,9 +53,15 @@ class Order(models.Model):
     phone = models.CharField(max_length=17)
     notes = models.TextField(blank=True)
     email_sent = models.BooleanField(default=False)
+    # Denormalized at checkout for summary listings
+    item_count = models.PositiveIntegerField(default=0)
+    thumbnail = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    SUMMARY_FIELDS = ('id', 'order_number', 'user_id', 'status', 'total_amount',
+                      'item_count', 'thumbnail', 'created_at')
+
     def __str__(self):
         return f"Order #{self.order_number} - {self.user.username}"
 
@@ -54,6 +71,7 @@ class Order(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', '-created_at'], name='orders_user_created_idx'),
         ]
 
 class OrderItem(models.Model):
@@ -79,3 +97,133 @@ class OrderItem(models.Model):
         indexes = [
             models.Index(fields=['order', 'product']),
         ]
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=64, unique=True)  # sha256 of user, method, path and header value
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    request_fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # Null while the request is in flight
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency key {self.key[:12]} - {self.user_id}"
+
+    class Meta:
+        db_table = 'idempotency_keys'
+
+
+class OutboxMessage(models.Model):
+    message_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)  # Reused as the Celery task id
+    task_name = models.CharField(max_length=200)
+    args = models.JSONField(encoder=DjangoJSONEncoder, default=list)
+    kwargs = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    dedup_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.task_name} [{self.message_id}]"
+
+    class Meta:
+        db_table = 'outbox_messages'
+        indexes = [
+            models.Index(fields=['published_at', 'id']),
+        ]
+
+
+class SalesRollup(models.Model):
+    """
+    Pre-aggregated sales for one time bucket and order status. Rows with
+    ``category_id`` 0 hold whole-order totals; other rows hold the share of
+    orders, units and revenue coming from that product category.
+    """
+    bucket = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    category_id = models.BigIntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+class HourlySalesRollup(SalesRollup):
+    class Meta:
+        db_table = 'sales_rollups_hourly'
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'status', 'category_id'], name='sales_rollups_hourly_key'),
+        ]
+
+class DailySalesRollup(SalesRollup):
+    class Meta:
+        db_table = 'sales_rollups_daily'
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'status', 'category_id'], name='sales_rollups_daily_key'),
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Delivered or cancelled order moved out of ``orders`` by
+    ``orders.archive``. Ids are kept from the hot table, and there are no
+    unique constraints besides the primary key so the table can be range
+    partitioned by ``created_at`` on PostgreSQL.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order_number = models.UUIDField(db_index=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_orders'
+    )
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    shipping_address = models.TextField()
+    phone = models.CharField(max_length=17)
+    notes = models.TextField(blank=True)
+    email_sent = models.BooleanField(default=False)
+    item_count = models.PositiveIntegerField(default=0)
+    thumbnail = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived order #{self.order_number}"
+
+    class Meta:
+        db_table = 'orders_archive'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='orders_archive_user_idx'),
+            models.Index(fields=['created_at'], name='orders_archive_created_idx'),
+        ]
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='items'
+    )
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False)
+    product_name = models.CharField(max_length=200)
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    order_created_at = models.DateTimeField()  # Partition key, copied from the order
+
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
+
+    class Meta:
+        db_table = 'order_items_archive'
@@ -0,0 +1,251 @@
+import logging
+import threading
+import time
+import uuid
+
+from celery import Task, current_app
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Key added to each item of a merged batch: the outbox message it came from
+SOURCE_FIELD = 'outbox_message_id'
+
+
+def enqueue(task, *args, dedup_key=None, **kwargs):
+    """
+    Record a Celery task in the outbox as part of the current transaction.
+
+    Works like ``task.delay(*args, **kwargs)`` except that nothing is sent to
+    the broker until the surrounding transaction commits; a rolled back
+    transaction discards the message with it. Messages sharing a
+    ``dedup_key`` are only recorded once.
+    """
+    from .models import OutboxMessage
+
+    task_name = task if isinstance(task, str) else task.name
+    fields = {'task_name': task_name, 'args': list(args), 'kwargs': kwargs}
+
+    if dedup_key:
+        message, _ = OutboxMessage.objects.get_or_create(dedup_key=dedup_key, defaults=fields)
+    else:
+        message = OutboxMessage.objects.create(**fields)
+
+    transaction.on_commit(relay.wake)
+    return message
+
+
+def publish_pending(batch_size=None):
+    """
+    Publish unpublished outbox messages to the broker in batches.
+
+    Each batch is locked with ``SKIP LOCKED`` so several relays can run side by
+    side, sent over a single pooled producer connection and then marked as
+    published. A failure rolls the batch back and it is retried on the next
+    run, so delivery is at-least-once; :class:`OutboxTask` drops what was
+    already delivered.
+
+    Messages for tasks declaring ``outbox_batch_size`` are merged: their
+    single list argument is concatenated into one call per
+    ``outbox_batch_size`` items, each item tagged with the message it came
+    from.
+    """
+    from .models import OutboxMessage
+
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    published = 0
+
+    while True:
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(published_at__isnull=True)
+                .order_by('id')[:batch_size]
+            )
+
+            if not messages:
+                break
+
+            with current_app.producer_or_acquire() as producer:
+                for task_name, args, kwargs, task_id in _coalesce(messages):
+                    _send(task_name, args, kwargs, task_id, producer)
+
+            OutboxMessage.objects.filter(id__in=[m.id for m in messages]).update(
+                published_at=timezone.now()
+            )
+
+        published += len(messages)
+        if len(messages) < batch_size:
+            break
+
+    if published:
+        logger.info(f"Outbox relay published {published} messages")
+    return published
+
+
+def _coalesce(messages):
+    """Yield ``(task_name, args, kwargs, task_id)`` calls for a batch of messages."""
+    batches = {}
+
+    for message in messages:
+        task = current_app.tasks.get(message.task_name)
+        batch_size = getattr(task, 'outbox_batch_size', None)
+
+        if not batch_size:
+            yield message.task_name, message.args, message.kwargs, str(message.message_id)
+            continue
+
+        batch = batches.setdefault(message.task_name, [])
+        batch.append(message)
+
+        if sum(len(m.args[0]) for m in batch) >= batch_size:
+            yield _merge(batch)
+            batches[message.task_name] = []
+
+    for batch in batches.values():
+        if batch:
+            yield _merge(batch)
+
+
+def _merge(batch):
+    # A retried relay run may group the same messages differently, so
+    # duplicates are recognised per source message rather than per task id
+    items = [
+        {**item, SOURCE_FIELD: str(message.message_id)}
+        for message in batch for item in message.args[0]
+    ]
+
+    if len(batch) == 1:
+        task_id = str(batch[0].message_id)
+    else:
+        task_id = str(uuid.uuid5(uuid.NAMESPACE_OID, ','.join(str(m.message_id) for m in batch)))
+
+    return batch[0].task_name, [items], batch[0].kwargs, task_id
+
+
+def _send(task_name, args, kwargs, task_id, producer):
+    task = current_app.tasks.get(task_name)
+
+    if task is not None:
+        task.apply_async(args=args, kwargs=kwargs, task_id=task_id, producer=producer)
+    else:
+        current_app.send_task(task_name, args=args, kwargs=kwargs, task_id=task_id, producer=producer)
+
+
+class OutboxRelay:
+    """
+    Per-process background publisher woken after each commit that wrote to
+    the outbox, so the request thread never waits on the broker. Wake-ups
+    arriving within ``OUTBOX_RELAY_WINDOW`` are coalesced into one drain.
+    The periodic ``relay_outbox`` task picks up anything left behind if the
+    process dies before draining.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        mode = settings.OUTBOX_RELAY_MODE
+
+        if mode == 'inline':
+            publish_pending()
+        elif mode == 'thread':
+            self._ensure_started()
+            self._event.set()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='outbox-relay', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._event.wait()
+            time.sleep(settings.OUTBOX_RELAY_WINDOW)
+            self._event.clear()
+
+            try:
+                publish_pending()
+            except Exception as e:
+                logger.error(f"Outbox relay failed: {e}", exc_info=True)
+            finally:
+                close_old_connections()
+
+
+relay = OutboxRelay()
+
+
+class OutboxTask(Task):
+    """
+    Task base class that skips what was already delivered, turning the
+    relay's at-least-once delivery into effectively-once runs.
+
+    A plain message is skipped when its task id (the message id) completed
+    before. For batched tasks each item carries its source message id; items
+    from messages that completed before are dropped from the call, whatever
+    batch they were first delivered in.
+    """
+
+    def __call__(self, *args, **kwargs):
+        task_id = self.request.id
+
+        if getattr(self, 'outbox_batch_size', None) and args and isinstance(args[0], list):
+            done = _done(_sources(args[0]))
+            if done:
+                items = [item for item in args[0] if item.get(SOURCE_FIELD) not in done]
+                logger.info(f"Skipping {len(args[0]) - len(items)} duplicate items of {self.name} [{task_id}]")
+                if not items:
+                    return None
+                args = (items, *args[1:])
+        elif task_id and _done([task_id]):
+            logger.info(f"Skipping duplicate delivery of {self.name} [{task_id}]")
+            return None
+
+        return super().__call__(*args, **kwargs)
+
+    def on_success(self, retval, task_id, args, kwargs):
+        if getattr(self, 'outbox_batch_size', None) and args and isinstance(args[0], list):
+            sources = _sources(args[0])
+        else:
+            sources = [task_id]
+        _mark_done(sources)
+
+    def retry_failed(self, items, failed, **options):
+        """
+        Retry a batch with only its ``failed`` items. ``on_success`` does not
+        run for this attempt, so the sources all of whose items were
+        delivered are recorded first; a source with a failed item is
+        recorded once the retry succeeds.
+        """
+        _mark_done(_sources(items) - _sources(failed))
+        return self.retry(args=[failed], **options)
+
+
+def _sources(items):
+    return {item[SOURCE_FIELD] for item in items if isinstance(item, dict) and SOURCE_FIELD in item}
+
+
+def _done_key(source):
+    return f'outbox_done_{source}'
+
+
+def _mark_done(sources):
+    if sources:
+        cache.set_many({_done_key(source): 1 for source in sources}, settings.OUTBOX_DEDUP_TTL)
+
+
+def _done(sources):
+    """The message ids among ``sources`` that were already delivered."""
+    if not sources:
+        return set()
+    found = cache.get_many([_done_key(source) for source in sources])
+    return {source for source in sources if _done_key(source) in found}
@@ -0,0 +1,271 @@
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALL_CATEGORIES = 0
+CENTS = Decimal('0.01')
+
+
+def order_created(order_id):
+    """Queue the rollup increment for a new order; call inside the checkout transaction."""
+    _enqueue({'type': 'created', 'order_id': order_id})
+
+
+def status_changed(order_id, old_status, new_status):
+    """Queue moving an order between status rows; call inside the updating transaction."""
+    if old_status != new_status:
+        _enqueue(status_event(order_id, old_status, new_status))
+
+
+def status_event(order_id, old_status, new_status):
+    return {'type': 'status', 'order_id': order_id, 'old_status': old_status, 'new_status': new_status}
+
+
+def _enqueue(event):
+    from . import outbox
+    from .tasks import update_sales_rollups
+
+    outbox.enqueue(update_sales_rollups, [event])
+
+
+def _models():
+    from .models import DailySalesRollup, HourlySalesRollup
+
+    return (
+        (HourlySalesRollup, lambda dt: dt.replace(minute=0, second=0, microsecond=0)),
+        (DailySalesRollup, lambda dt: dt.replace(hour=0, minute=0, second=0, microsecond=0)),
+    )
+
+
+def _order_lines(order_ids):
+    """Per-order totals and per-category lines for a set of orders, in two queries."""
+    from .models import Order, OrderItem
+
+    orders = {
+        row['id']: row
+        for row in Order.objects.filter(id__in=order_ids).values('id', 'created_at', 'total_amount')
+    }
+    units = defaultdict(int)
+    lines = defaultdict(list)
+
+    category_rows = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values('order_id', 'product__category_id')
+        .annotate(units=Sum('quantity'), revenue=Sum('subtotal'))
+    )
+    for row in category_rows:
+        units[row['order_id']] += row['units']
+        lines[row['order_id']].append((row['product__category_id'], row['units'], row['revenue']))
+
+    return orders, units, lines
+
+
+def apply_events(events):
+    """
+    Fold order events into the hourly and daily rollups.
+
+    Deltas for the whole batch are summed first, so a burst of checkouts in
+    the same hour turns into one UPDATE per touched row.
+    """
+    order_ids = {event['order_id'] for event in events}
+    orders, units, lines = _order_lines(order_ids)
+    deltas = defaultdict(lambda: [0, 0, Decimal('0')])
+
+    for event in events:
+        order = orders.get(event['order_id'])
+        if order is None:
+            continue
+
+        if event['type'] == 'created':
+            moves = [('pending', 1)]
+        else:
+            moves = [(event['old_status'], -1), (event['new_status'], 1)]
+
+        created_at = order['created_at'].astimezone(dt_timezone.utc)
+
+        for model, truncate in _models():
+            bucket = truncate(created_at)
+
+            for status, sign in moves:
+                total = deltas[(model, bucket, status, ALL_CATEGORIES)]
+                total[0] += sign
+                total[1] += sign * units[order['id']]
+                total[2] += sign * order['total_amount']
+
+                for category_id, category_units, category_revenue in lines[order['id']]:
+                    line = deltas[(model, bucket, status, category_id)]
+                    line[0] += sign
+                    line[1] += sign * category_units
+                    line[2] += sign * category_revenue
+
+    with transaction.atomic():
+        for (model, bucket, status, category_id), (count, unit_count, revenue) in deltas.items():
+            _increment(model, bucket, status, category_id, count, unit_count, revenue)
+
+
+def _increment(model, bucket, status, category_id, count, unit_count, revenue):
+    key = {'bucket': bucket, 'status': status, 'category_id': category_id}
+    changes = {
+        'orders': F('orders') + count,
+        'units': F('units') + unit_count,
+        'revenue': F('revenue') + revenue,
+    }
+
+    if model.objects.filter(**key).update(**changes):
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(orders=count, units=unit_count, revenue=revenue, **key)
+    except IntegrityError:
+        # Another worker created the row first
+        model.objects.filter(**key).update(**changes)
+
+
+def _sources(start, end):
+    """Orders created in ``[start, end)`` and their items, from the hot tables and the archive."""
+    from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+    hot = Order.objects.filter(created_at__gte=start, created_at__lt=end)
+    return (
+        (hot, OrderItem.objects.filter(order__in=hot), 'order__created_at'),
+        (
+            ArchivedOrder.objects.filter(created_at__gte=start, created_at__lt=end),
+            # Filtered on the partition key, not through the join
+            ArchivedOrderItem.objects.filter(order_created_at__gte=start, order_created_at__lt=end),
+            'order_created_at',
+        ),
+    )
+
+
+def rebuild(since, until=None):
+    """
+    Recompute rollup rows from the orders tables and their archive,
+    replacing what the incremental path wrote. Only buckets that are
+    complete by ``until`` are rewritten, so the current hour and day keep
+    their live counters.
+    """
+    until = until or timezone.now()
+    rebuilt = 0
+
+    for (model, truncate), trunc in zip(_models(), (TruncHour, TruncDay)):
+        start = truncate(since.astimezone(dt_timezone.utc))
+        end = truncate(until.astimezone(dt_timezone.utc))
+        # (bucket, status, category_id) -> [orders, units, revenue]; an order
+        # is either hot or archived, so the two sources add up
+        totals = defaultdict(lambda: [0, 0, Decimal('0')])
+
+        for orders, items, created_at in _sources(start, end):
+            order_totals = (
+                orders.annotate(bucket=trunc('created_at', tzinfo=dt_timezone.utc))
+                .values('bucket', 'status')
+                .annotate(orders=Count('id'), revenue=Sum('total_amount'))
+            )
+            unit_totals = (
+                items.annotate(bucket=trunc(created_at, tzinfo=dt_timezone.utc))
+                .values('bucket', 'order__status')
+                .annotate(units=Sum('quantity'))
+            )
+            categories = (
+                items.annotate(bucket=trunc(created_at, tzinfo=dt_timezone.utc))
+                .values('bucket', 'order__status', 'product__category_id')
+                .annotate(orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum('subtotal'))
+            )
+
+            for row in order_totals:
+                total = totals[(row['bucket'], row['status'], ALL_CATEGORIES)]
+                total[0] += row['orders']
+                total[2] += row['revenue']
+            for row in unit_totals:
+                totals[(row['bucket'], row['order__status'], ALL_CATEGORIES)][1] += row['units']
+            for row in categories:
+                line = totals[(row['bucket'], row['order__status'], row['product__category_id'])]
+                line[0] += row['orders']
+                line[1] += row['units']
+                line[2] += row['revenue']
+
+        rows = [
+            model(bucket=bucket, status=status, category_id=category_id, orders=count, units=units, revenue=revenue)
+            for (bucket, status, category_id), (count, units, revenue) in totals.items()
+        ]
+
+        with transaction.atomic():
+            model.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+            model.objects.bulk_create(rows, batch_size=1000)
+
+        rebuilt += len(rows)
+
+    logger.info(f"Rebuilt {rebuilt} sales rollup rows since {since.isoformat()}")
+    return rebuilt
+
+
+def reconcile(hours=48):
+    return rebuild(timezone.now() - timedelta(hours=hours))
+
+
+def dashboard(period, start, end, top=10):
+    """
+    Sales summary for ``[start, end)`` read only from the rollup tables.
+
+    Cancelled orders are excluded from the series, totals and top categories
+    and reported separately under ``by_status``.
+    """
+    from products.models import Category
+    from .models import DailySalesRollup, HourlySalesRollup
+
+    model = DailySalesRollup if period == 'day' else HourlySalesRollup
+    rows = model.objects.filter(bucket__gte=start, bucket__lt=end)
+    totals = rows.filter(category_id=ALL_CATEGORIES)
+    sums = {'orders': Sum('orders'), 'units': Sum('units'), 'revenue': Sum('revenue')}
+
+    series = list(
+        totals.exclude(status='cancelled')
+        .values('bucket')
+        .annotate(**sums)
+        .order_by('bucket')
+    )
+    by_status = {
+        row['status']: {'orders': row['orders'], 'units': row['units'], 'revenue': row['revenue']}
+        for row in totals.values('status').annotate(**sums).order_by('status')
+    }
+    top_categories = list(
+        rows.exclude(category_id=ALL_CATEGORIES)
+        .exclude(status='cancelled')
+        .values('category_id')
+        .annotate(**sums)
+        .order_by('-revenue')[:top]
+    )
+
+    names = dict(
+        Category.objects.filter(id__in=[row['category_id'] for row in top_categories])
+        .values_list('id', 'name')
+    )
+    for row in top_categories:
+        row['category_name'] = names.get(row['category_id'])
+
+    summary = {'orders': 0, 'units': 0, 'revenue': Decimal('0')}
+    for status, values in by_status.items():
+        if status != 'cancelled':
+            for field in summary:
+                summary[field] += values[field]
+
+    # Money is returned as a string, like DecimalField elsewhere in the API
+    for row in [summary, *by_status.values(), *series, *top_categories]:
+        row['revenue'] = str(Decimal(row['revenue'] or 0).quantize(CENTS))
+
+    return {
+        'period': period,
+        'start': start,
+        'end': end,
+        'totals': summary,
+        'by_status': by_status,
+        'series': series,
+        'top_categories': top_categories,
+    }
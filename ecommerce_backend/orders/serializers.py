@@ -1,7 +1,18 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
 from products.serializers import ProductSerializer
 
+def media_url(name, context):
+    if not name:
+        return None
+    
+    url = default_storage.url(name)
+    request = context.get('request')
+    return request.build_absolute_uri(url) if request else url
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     
@@ -22,6 +33,53 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'order_number', 'user', 'total_amount', 
                            'email_sent', 'created_at', 'updated_at')
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    thumbnail = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Order
+        fields = ('id', 'order_number', 'status', 'total_amount', 'item_count', 
+                  'thumbnail', 'created_at')
+        read_only_fields = fields
+
+    def get_thumbnail(self, obj):
+        return media_url(obj.thumbnail, self.context)
+
+class OrderHistorySerializer(serializers.Serializer):
+    """Summary row from the combined hot and archived listing (a ``values()`` dict)."""
+    id = serializers.IntegerField()
+    order_number = serializers.UUIDField()
+    status = serializers.CharField()
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    item_count = serializers.IntegerField()
+    thumbnail = serializers.SerializerMethodField()
+    created_at = serializers.DateTimeField()
+    archived = serializers.BooleanField()
+
+    def get_thumbnail(self, obj):
+        return media_url(obj['thumbnail'], self.context)
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ('id', 'product', 'product_name', 'quantity', 'price', 'subtotal')
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    user_email = serializers.EmailField(source='user.email', read_only=True)
+    user_name = serializers.CharField(source='user.get_full_name', read_only=True)
+    archived = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ArchivedOrder
+        fields = ('id', 'order_number', 'user', 'user_email', 'user_name', 'status', 
+                  'payment_method', 'total_amount', 'shipping_address', 'phone', 
+                  'notes', 'email_sent', 'items', 'created_at', 'updated_at', 'archived')
+        read_only_fields = fields
+
+    def get_archived(self, obj):
+        return True
+
 class CreateOrderSerializer(serializers.Serializer):
     payment_method = serializers.ChoiceField(choices=Order.PAYMENT_CHOICES)
     shipping_address = serializers.CharField()
@@ -39,4 +97,47 @@ class CreateOrderSerializer(serializers.Serializer):
         return value
 
 class UpdateOrderStatusSerializer(serializers.Serializer):
-    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
\ No newline at end of file
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+class BulkUpdateOrderStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.ORDER_BULK_STATUS_MAX_ORDERS
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+class SalesDashboardQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=('day', 'hour'), default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False, help_text='Inclusive')
+
+    def validate(self, attrs):
+        today = datetime.now(dt_timezone.utc).date()
+        end = attrs.get('end') or today
+        default_days = 30 if attrs['period'] == 'day' else 1
+        start = attrs.get('start') or end - timedelta(days=default_days - 1)
+
+        if start > end:
+            raise serializers.ValidationError("start must not be after end")
+
+        attrs['start'] = datetime.combine(start, time.min, tzinfo=dt_timezone.utc)
+        attrs['end'] = datetime.combine(end + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+
+        if attrs['period'] == 'day':
+            too_long = (attrs['end'] - attrs['start']).days > settings.SALES_DASHBOARD_MAX_DAYS
+        else:
+            too_long = (attrs['end'] - attrs['start']) > timedelta(hours=settings.SALES_DASHBOARD_MAX_HOURS)
+
+        if too_long:
+            raise serializers.ValidationError("Requested range is too large for this period")
+
+        return attrs
+
+
+class OrderExportQuerySerializer(serializers.Serializer):
+    # Not "format": DRF reserves that query parameter for renderer selection
+    output = serializers.ChoiceField(choices=('csv', 'ndjson'), default='csv')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False, help_text='Inclusive')
+    status = serializers.MultipleChoiceField(choices=Order.STATUS_CHOICES, required=False)
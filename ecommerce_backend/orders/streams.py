@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import secrets
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .events import backlog, event_id_order, get_hub
+
+logger = logging.getLogger(__name__)
+
+
+def _ticket_key(ticket):
+    return f'order_events_ticket_{ticket}'
+
+
+def issue_ticket(user_id):
+    """
+    A ticket for opening the stream as ``user_id``. EventSource cannot send
+    headers, so browsers pass this in the query string instead of their
+    access token, which would otherwise end up in access logs and browser
+    history.
+
+    It must be used within ``ORDER_EVENTS_TICKET_TTL`` seconds. EventSource
+    reconnects with the same URL, so every stream opened with it keeps it
+    valid until that long after the stream is cut off.
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(_ticket_key(ticket), user_id, settings.ORDER_EVENTS_TICKET_TTL)
+    return ticket
+
+
+async def _redeem(ticket):
+    key = _ticket_key(ticket)
+    user_id = await cache.aget(key)
+
+    if user_id is not None:
+        await cache.atouch(key, settings.ORDER_EVENTS_MAX_STREAM_SECONDS + settings.ORDER_EVENTS_TICKET_TTL)
+    return user_id
+
+
+async def _user_id(request):
+    header = request.headers.get('Authorization', '')
+    parts = header.split()
+
+    if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+        try:
+            return AccessToken(parts[1])[api_settings.USER_ID_CLAIM]
+        except (TokenError, KeyError):
+            return None
+
+    ticket = request.GET.get('ticket')
+    return await _redeem(ticket) if ticket else None
+
+
+async def _authenticate(request):
+    user_id = await _user_id(request)
+    if user_id is None:
+        return None
+
+    exists = await get_user_model().objects.filter(
+        **{api_settings.USER_ID_FIELD: user_id, 'is_active': True}
+    ).aexists()
+    return user_id if exists else None
+
+
+def _message(event_id, data):
+    return f'id: {event_id}\nevent: order\ndata: {data}\n\n'
+
+
+async def _missed(user_id, last_event_id):
+    """Events logged since ``last_event_id``, or none if it is not one of ours or Redis is down."""
+    if event_id_order(last_event_id) is None:
+        return []
+    try:
+        return await backlog(user_id, last_event_id)
+    except Exception as e:
+        logger.warning(f"Could not replay order events for user {user_id}: {e}")
+        return []
+
+
+async def _events(user_id, last_event_id=None):
+    hub = get_hub()
+    # Subscribed before reading the backlog, so nothing falls in between
+    queue = hub.subscribe(user_id)
+    heartbeat = settings.ORDER_EVENTS_HEARTBEAT
+    deadline = time.monotonic() + settings.ORDER_EVENTS_MAX_STREAM_SECONDS
+    last = event_id_order(last_event_id)
+
+    try:
+        yield f'retry: {settings.ORDER_EVENTS_RETRY_MS}\n\n'
+
+        for event_id, data in await _missed(user_id, last_event_id):
+            last = event_id_order(event_id)
+            yield _message(event_id, data)
+
+        # Django 4.2 does not notice client disconnects, so streams are capped.
+        # The client's EventSource reconnects on its own, with the same ticket
+        # and a Last-Event-ID header to resume from.
+        while time.monotonic() < deadline:
+            try:
+                message = json.loads(await asyncio.wait_for(queue.get(), timeout=heartbeat))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+
+            order = event_id_order(message['id'])
+            if last is not None and order <= last:
+                continue  # Already sent from the backlog
+            last = order
+            yield _message(message['id'], message['data'])
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+async def order_status_stream(request):
+    """
+    Server-Sent Events stream of status changes for the caller's orders.
+
+    Only served under ASGI, where each open stream is a coroutine parked on
+    a queue rather than a worker thread. Clients authenticate with a bearer
+    token or, from a browser's EventSource, with ``?ticket=`` from
+    ``POST /api/orders/events/ticket/``. Each event carries an ``id``; a
+    reconnect sending ``Last-Event-ID`` first gets the events it missed.
+    """
+    # require_GET is not async-aware before Django 5.0
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': True, 'message': 'Order events are only available from the ASGI server'},
+            status=501
+        )
+
+    user_id = await _authenticate(request)
+    if user_id is None:
+        return JsonResponse(
+            {'error': True, 'message': 'Authentication credentials were not provided or are invalid'},
+            status=401
+        )
+
+    response = StreamingHttpResponse(
+        _events(user_id, request.headers.get('Last-Event-ID')), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,113 +1,110 @@
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
+from .outbox import OutboxTask
+from . import emails
 import logging
 
 logger = logging.getLogger(__name__)
 
-@shared_task(bind=True, max_retries=3)
-def send_order_confirmation_email(self, order_id):
-    from .models import Order
-    
-    try:
-        order = Order.objects.select_related('user').prefetch_related('items__product').get(id=order_id)
-        
-        subject = f'Order Confirmation - Order #{order.order_number}'
-        
-        # Create email body
-        message = f"""
-Dear {order.user.first_name or order.user.username},
-
-Thank you for your order!
-
-Order Details:
-Order ID: #{order.order_number}
-Total Amount: ${order.total_amount}
-Payment Method: {order.get_payment_method_display()}
-Status: {order.get_status_display()}
-
-Shipping Address:
-{order.shipping_address}
-Phone: {order.phone}
-
-Order Items:
-"""
-        
-        for item in order.items.all():
-            message += f"\n- {item.product_name} x {item.quantity} = ${item.subtotal}"
-        
-        message += """
-
-Your order is being processed and will be shipped soon.
-You can track your order status in your account.
-
-Thank you for shopping with us!
-
-Best regards,
-E-commerce Team
-"""
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[order.user.email],
-            fail_silently=False,
-        )
-        
-        # Mark email as sent
-        order.email_sent = True
-        order.save(update_fields=['email_sent'])
-        
-        logger.info(f"Order confirmation email sent for order #{order.order_number}")
-        return True
-        
-    except Order.DoesNotExist:
-        logger.error(f"Order {order_id} not found")
-        return False
-    except Exception as e:
-        logger.error(f"Error sending email for order {order_id}: {e}")
-        # Retry with exponential backoff
-        raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
-
-@shared_task
+# Queues are assigned in CELERY_TASK_ROUTES. Results are never read, so none
+# are stored; tasks that are safe to run twice are acknowledged after they
+# finish, so a worker lost mid-task does not lose the message.
+
+
+def _deliver_batch(task, notifications):
+    failed = emails.deliver(notifications)
+
+    if failed:
+        raise task.retry_failed(notifications, failed, countdown=60 * (2 ** task.request.retries))
+
+    return len(notifications)
+
+
+@shared_task(
+    bind=True, base=OutboxTask, max_retries=3, ignore_result=True, acks_late=True,
+    outbox_batch_size=settings.ORDER_EMAIL_BATCH_SIZE,
+)
+def send_order_emails(self, notifications):
+    """
+    Send a batch of order notifications (see ``orders.emails``) over a single
+    SMTP connection. The outbox relay merges pending notifications into one
+    call of up to ``ORDER_EMAIL_BATCH_SIZE``; failed ones are retried alone.
+    """
+    return _deliver_batch(self, notifications)
+
+
+@shared_task(
+    bind=True, base=OutboxTask, max_retries=3, ignore_result=True, acks_late=True,
+    rate_limit=settings.BULK_EMAIL_RATE_LIMIT, outbox_batch_size=settings.ORDER_EMAIL_BATCH_SIZE,
+)
+def send_bulk_order_emails(self, notifications):
+    """
+    ``send_order_emails`` for notifications from bulk status updates, on
+    their own rate-limited queue so a large batch never delays the order
+    confirmations behind it.
+    """
+    return _deliver_batch(self, notifications)
+
+
+# Kept for messages published before batching was introduced
+@shared_task(base=OutboxTask, ignore_result=True, acks_late=True)
+def send_order_confirmation_email(order_id):
+    return not emails.deliver([emails.confirmation(order_id)])
+
+
+@shared_task(base=OutboxTask, ignore_result=True, acks_late=True)
 def send_order_status_update_email(order_id, old_status, new_status):
-    from .models import Order
-    
-    try:
-        order = Order.objects.select_related('user').get(id=order_id)
-        
-        subject = f'Order Status Update - Order #{order.order_number}'
-        
-        message = f"""
-Dear {order.user.first_name or order.user.username},
-
-Your order status has been updated.
-
-Order ID: #{order.order_number}
-Previous Status: {old_status}
-Current Status: {new_status}
-
-You can view your order details in your account.
-
-Thank you for shopping with us!
-
-Best regards,
-E-commerce Team
-"""
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[order.user.email],
-            fail_silently=False,
-        )
-        
-        logger.info(f"Status update email sent for order #{order.order_number}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error sending status update email: {e}")
-        return False
\ No newline at end of file
+    return not emails.deliver([emails.status_update(order_id, old_status, new_status)])
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def purge_expired_idempotency_keys():
+    from django.utils import timezone
+    from .models import IdempotencyKey
+
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    logger.info(f"Purged {deleted} expired idempotency keys")
+    return deleted
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def relay_outbox():
+    from .outbox import publish_pending
+
+    return publish_pending()
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def purge_published_outbox_messages():
+    from datetime import timedelta
+    from django.utils import timezone
+    from .models import OutboxMessage
+
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxMessage.objects.filter(published_at__lt=cutoff).delete()
+    logger.info(f"Purged {deleted} published outbox messages")
+    return deleted
+
+
+# Acknowledged on receipt: running a batch twice would count its orders twice
+@shared_task(base=OutboxTask, ignore_result=True, outbox_batch_size=settings.SALES_ROLLUP_BATCH_SIZE)
+def update_sales_rollups(events):
+    from . import rollups
+
+    rollups.apply_events(events)
+    return len(events)
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def reconcile_sales_rollups(hours=48):
+    from . import rollups
+
+    return rollups.reconcile(hours)
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def archive_old_orders():
+    from .archive import archive_orders, ensure_archive_partitions
+
+    ensure_archive_partitions()
+    return archive_orders()
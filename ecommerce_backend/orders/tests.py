@@ -1,3 +1,403 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+import redis
+from celery import current_app
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import User
+from cart.models import CartItem
+from products.models import Category, Product
+from . import archive, emails, events, export, idempotency, outbox, rollups, streams
+from .models import ArchivedOrder, DailySalesRollup, Order, OrderItem, OutboxMessage
+from .tasks import send_order_emails, send_order_status_update_email, update_sales_rollups
 
-# Create your tests here.
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def redis_available():
+    try:
+        return redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.5).ping()
+    except redis.RedisError:
+        return False
+
+
+REDIS = redis_available()
+
+
+@override_settings(
+    CACHES=LOCAL_CACHES,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    OUTBOX_RELAY_MODE='off',
+)
+class OrdersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password', role='owner')
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'password')
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            category=self.category, name='Novel', description='A novel', price='10.00',
+            stock=100, created_by=self.owner,
+        )
+
+    def create_order(self, **fields):
+        return Order.objects.create(
+            user=self.customer, total_amount='10.00', shipping_address='1 Main Street, Springfield',
+            phone='1234567890', **fields,
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class IdempotencyTests(OrdersTestCase):
+    url = '/api/cart/add_item/'
+
+    def add_item(self, client, key, quantity=1):
+        return client.post(
+            self.url, {'product_id': self.product.id, 'quantity': quantity},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def digest(self, user, key):
+        request = SimpleNamespace(user=user, method='POST', path=self.url)
+        return idempotency._scope_digest(request, key)
+
+    def test_retry_replays_the_first_response(self):
+        client = self.client_for(self.customer)
+
+        first = self.add_item(client, 'key-1', quantity=2)
+        retry = self.add_item(client, 'key-1', quantity=2)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(CartItem.objects.get(product=self.product).quantity, 2)
+
+    def test_reused_key_with_a_different_body_is_rejected(self):
+        client = self.client_for(self.customer)
+
+        self.add_item(client, 'key-1', quantity=1)
+        response = self.add_item(client, 'key-1', quantity=3)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(CartItem.objects.get(product=self.product).quantity, 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.add_item(self.client_for(self.customer), 'key-1')
+        response = self.add_item(self.client_for(self.owner), 'key-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header(idempotency.REPLAYED_HEADER))
+
+    def test_replay_survives_a_cache_flush(self):
+        client = self.client_for(self.customer)
+
+        self.add_item(client, 'key-1')
+        cache.clear()
+        retry = self.add_item(client, 'key-1')
+
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(CartItem.objects.get(product=self.product).quantity, 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.2)
+    def test_request_in_flight_gets_a_conflict(self):
+        digest = self.digest(self.customer, 'key-1')
+        cache.add(idempotency._lock_key(digest), 'other-request', 30)
+
+        response = self.add_item(self.client_for(self.customer), 'key-1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_waits_for_the_request_in_flight_and_replays_it(self):
+        digest = self.digest(self.customer, 'key-1')
+        cache.add(idempotency._lock_key(digest), 'other-request', 30)
+        fingerprint = idempotency._fingerprint(
+            SimpleNamespace(data={'product_id': self.product.id, 'quantity': 1}, query_params={})
+        )
+
+        # The request holding the lock finishes while this one waits
+        finish = threading.Timer(0.1, cache.set, args=(
+            idempotency._cache_key(digest), (fingerprint, 201, {'success': True}), 60,
+        ))
+        finish.start()
+        response = self.add_item(self.client_for(self.customer), 'key-1')
+        finish.join()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(response[idempotency.REPLAYED_HEADER], 'true')
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_order_is_created_once(self):
+        client = self.client_for(self.customer)
+        self.add_item(client, 'cart-key', quantity=2)
+        body = {'payment_method': 'cod', 'shipping_address': '1 Main Street, Springfield', 'phone': '1234567890'}
+
+        first = client.post('/api/orders/', body, format='json', HTTP_IDEMPOTENCY_KEY='order-key')
+        retry = client.post('/api/orders/', body, format='json', HTTP_IDEMPOTENCY_KEY='order-key')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.json()['order']['id'], first.json()['order']['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 98)
+
+
+class OutboxTests(OrdersTestCase):
+    def pending_orders(self):
+        return DailySalesRollup.objects.get(status='pending', category_id=rollups.ALL_CATEGORIES).orders
+
+    def relay(self, messages):
+        for task_name, args, kwargs, task_id in outbox._coalesce(messages):
+            current_app.tasks[task_name].apply(args=args, kwargs=kwargs, task_id=task_id)
+
+    def test_regrouped_batch_skips_messages_already_applied(self):
+        first, second = self.create_order(), self.create_order()
+        rollups.order_created(first.id)
+        rollups.order_created(second.id)
+        messages = list(OutboxMessage.objects.order_by('id'))
+
+        # The first run delivered one message but could not mark it published,
+        # so the next run sends it again, merged with the other under a new task id
+        self.relay(messages[:1])
+        self.relay(messages)
+
+        self.assertEqual(self.pending_orders(), 2)
+
+    def test_merged_items_carry_their_source_message(self):
+        orders = [self.create_order() for _ in range(3)]
+        for order in orders:
+            rollups.order_created(order.id)
+        messages = list(OutboxMessage.objects.order_by('id'))
+
+        [(task_name, args, kwargs, task_id)] = outbox._coalesce(messages)
+
+        self.assertEqual(task_name, update_sales_rollups.name)
+        self.assertEqual(
+            [item[outbox.SOURCE_FIELD] for item in args[0]],
+            [str(message.message_id) for message in messages],
+        )
+
+    def test_partly_failed_batch_records_the_delivered_sources(self):
+        orders = [self.create_order(), self.create_order()]
+        for order in orders:
+            outbox.enqueue(send_order_emails, [emails.status_update(order.id, 'Pending', 'Processing')])
+        messages = list(OutboxMessage.objects.order_by('id'))
+
+        def deliver(notifications):
+            # The second order's email fails the first time
+            if len(notifications) == 2:
+                return [notifications[1]]
+            return []
+
+        with mock.patch.object(emails, 'deliver', side_effect=deliver) as delivered:
+            self.relay(messages)  # Schedules a retry of the failed email
+            self.relay(messages)  # A later relay run sends both messages again
+
+        self.assertEqual(
+            [[item['order_id'] for item in call.args[0]] for call in delivered.call_args_list],
+            [[orders[0].id, orders[1].id], [orders[1].id]],
+        )
+
+    def test_redelivered_plain_task_runs_once(self):
+        order = self.create_order()
+        message = outbox.enqueue(send_order_status_update_email, order.id, 'Pending', 'Processing')
+
+        for _ in range(2):
+            send_order_status_update_email.apply(
+                args=message.args, kwargs=message.kwargs, task_id=str(message.message_id),
+            )
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_dedup_key_records_a_message_once(self):
+        order = self.create_order()
+
+        for _ in range(2):
+            outbox.enqueue(
+                'orders.tasks.send_order_emails', [emails.confirmation(order.id)],
+                dedup_key=f'order_confirmation_{order.id}',
+            )
+
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+
+class ArchiveTests(OrdersTestCase):
+    def old_order(self, days, status='delivered'):
+        order = self.create_order(status=status)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price='10.00')
+        Order.objects.filter(id=order.id).update(created_at=timezone.now() - timedelta(days=days))
+        return order
+
+    def test_export_includes_archived_orders(self):
+        old, recent = self.old_order(days=200), self.old_order(days=1)
+        self.assertEqual(archive.archive_orders(), 1)
+
+        day = (timezone.now() - timedelta(days=200)).date()
+        rows = list(export.export_rows(start=day - timedelta(days=1), end=timezone.now().date()))
+
+        self.assertTrue(ArchivedOrder.objects.filter(id=old.id).exists())
+        self.assertEqual([row[0] for row in rows], [old.order_number, recent.order_number])
+
+    def test_export_filters_archived_orders_by_date_and_status(self):
+        self.old_order(days=200, status='cancelled')
+        archive.archive_orders()
+
+        since = (timezone.now() - timedelta(days=100)).date()
+        self.assertEqual(list(export.export_rows(start=since)), [])
+        self.assertEqual(list(export.export_rows(statuses=['delivered'])), [])
+        self.assertEqual(len(list(export.export_rows(statuses=['cancelled']))), 1)
+
+    def test_rollups_are_rebuilt_from_archived_and_hot_orders(self):
+        self.old_order(days=200)
+        self.old_order(days=200, status='cancelled')
+        self.old_order(days=1)
+        self.assertEqual(archive.archive_orders(), 2)
+
+        call_command('rebuild_sales_rollups', days=366, include_current=True, stdout=StringIO())
+
+        old_day = DailySalesRollup.objects.filter(bucket__lt=timezone.now() - timedelta(days=100))
+        self.assertEqual(
+            sorted(old_day.values_list('status', 'category_id', 'orders', 'units', 'revenue')),
+            [
+                ('cancelled', rollups.ALL_CATEGORIES, 1, 1, Decimal('10.00')),
+                ('cancelled', self.category.id, 1, 1, Decimal('10.00')),
+                ('delivered', rollups.ALL_CATEGORIES, 1, 1, Decimal('10.00')),
+                ('delivered', self.category.id, 1, 1, Decimal('10.00')),
+            ],
+        )
+        self.assertEqual(DailySalesRollup.objects.filter(status='delivered').count(), 4)
+
+    def test_partitioning_is_refused_outside_postgresql(self):
+        with self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+            call_command('archive_orders', partition=True)
+
+
+class StatusUpdateTests(OrdersTestCase):
+    def test_single_update_can_correct_a_finished_order(self):
+        order = self.create_order(status='delivered')
+        client = self.client_for(self.owner)
+
+        response = client.patch(f'/api/orders/{order.id}/update_status/', {'status': 'shipped'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'shipped')
+
+    def test_single_update_applies_an_allowed_transition(self):
+        order = self.create_order()
+        client = self.client_for(self.owner)
+
+        response = client.patch(f'/api/orders/{order.id}/update_status/', {'status': 'processing'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'processing')
+
+    def test_bulk_update_reports_each_order(self):
+        pending, delivered = self.create_order(), self.create_order(status='delivered')
+        client = self.client_for(self.owner)
+
+        response = client.post('/api/orders/bulk_update_status/', {
+            'order_ids': [pending.id, delivered.id, 999999], 'status': 'shipped',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['result'] for result in response.json()['results']],
+            ['updated', 'invalid_transition', 'not_found'],
+        )
+        self.assertEqual(Order.objects.filter(status='shipped').count(), 1)
+
+
+class StreamTicketTests(OrdersTestCase):
+    def stream_request(self, ticket):
+        return RequestFactory().get('/api/orders/events/', {'ticket': ticket})
+
+    @override_settings(ORDER_EVENTS_TICKET_TTL=1, ORDER_EVENTS_MAX_STREAM_SECONDS=1)
+    async def test_ticket_is_kept_valid_for_reconnects(self):
+        ticket = await asyncio.to_thread(streams.issue_ticket, self.customer.pk)
+
+        self.assertEqual(await streams._authenticate(self.stream_request(ticket)), self.customer.pk)
+        await asyncio.sleep(1.2)  # Longer than the ticket was issued for
+        self.assertEqual(await streams._authenticate(self.stream_request(ticket)), self.customer.pk)
+
+    async def test_reconnect_gets_missed_events_once(self):
+        queue = asyncio.Queue()
+        hub = mock.Mock(subscribe=mock.Mock(return_value=queue))
+        missed = [('5-0', '{"n": 1}'), ('6-0', '{"n": 2}')]
+        # Published while the backlog was read: also delivered live
+        queue.put_nowait(json.dumps({'id': '6-0', 'data': '{"n": 2}'}))
+        queue.put_nowait(json.dumps({'id': '7-0', 'data': '{"n": 3}'}))
+
+        with mock.patch.object(streams, 'get_hub', return_value=hub), \
+                mock.patch.object(streams, 'backlog', mock.AsyncMock(return_value=missed)) as backlog:
+            stream = streams._events(self.customer.pk, '4-0')
+            messages = [await anext(stream) for _ in range(4)]
+            await stream.aclose()
+
+        backlog.assert_awaited_once_with(self.customer.pk, '4-0')
+        self.assertEqual(
+            [message.split('\n')[0] for message in messages[1:]], ['id: 5-0', 'id: 6-0', 'id: 7-0'],
+        )
+        self.assertEqual(messages[3], 'id: 7-0\nevent: order\ndata: {"n": 3}\n\n')
+        hub.unsubscribe.assert_called_once_with(self.customer.pk, queue)
+
+    async def test_unknown_ticket_and_access_token_in_query_are_rejected(self):
+        self.assertIsNone(await streams._authenticate(self.stream_request('not-a-ticket')))
+        request = RequestFactory().get('/api/orders/events/', {'token': 'an-access-token'})
+        self.assertIsNone(await streams._authenticate(request))
+
+    def test_ticket_endpoint_requires_authentication(self):
+        self.assertEqual(APIClient().post('/api/orders/events/ticket/').status_code, 401)
+
+        response = self.client_for(self.customer).post('/api/orders/events/ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.get(streams._ticket_key(response.json()['ticket'])), self.customer.pk)
+
+    def test_hubs_of_closed_loops_are_forgotten(self):
+        loop = asyncio.new_event_loop()
+        hub = loop.run_until_complete(self.get_hub())
+        loop.close()
+
+        self.assertIsNot(asyncio.run(self.get_hub()), hub)
+        self.assertNotIn(loop, events._hubs)
+
+    async def get_hub(self):
+        return events.get_hub()
+
+
+@skipUnless(REDIS, 'needs a Redis server at REDIS_URL')
+class EventBacklogTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_id = f'test-{self.customer.pk}-{id(self)}'
+        self.addCleanup(redis.from_url(settings.REDIS_URL).delete, events.backlog_key(self.user_id))
+
+    def test_published_events_can_be_replayed_after_an_id(self):
+        published = [
+            events.order_event('order_status', order_id, order_id, self.user_id, 'shipped') for order_id in (1, 2, 3)
+        ]
+        events.publish(published)
+
+        [(first_id, _), *rest] = asyncio.run(events.backlog(self.user_id, '0-0'))
+        replayed = asyncio.run(events.backlog(self.user_id, first_id))
+
+        self.assertEqual(replayed, rest)
+        self.assertEqual([json.loads(data)['order']['id'] for _, data in replayed], [2, 3])
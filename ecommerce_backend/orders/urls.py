@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .streams import order_status_stream
 from .views import OrderViewSet
 
 router = DefaultRouter()
 router.register('', OrderViewSet, basename='orders')
 
 urlpatterns = [
+    path('events/', order_status_stream, name='order-events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,16 +1,25 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.throttling import UserRateThrottle
+from ecommerce_backend.throttling import UserRateThrottle
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Q
-from .models import Order, OrderItem
+from django.db.models import BooleanField, Value
+from django.http import Http404
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Order, OrderItem, ArchivedOrder
 from .serializers import (
-    OrderSerializer, CreateOrderSerializer, 
-    UpdateOrderStatusSerializer
+    OrderSerializer, OrderSummarySerializer, OrderHistorySerializer,
+    ArchivedOrderSerializer, CreateOrderSerializer, 
+    UpdateOrderStatusSerializer, BulkUpdateOrderStatusSerializer, SalesDashboardQuerySerializer,
+    OrderExportQuerySerializer
 )
-from .tasks import send_order_confirmation_email, send_order_status_update_email
+from .tasks import send_order_emails
+from .idempotency import idempotent
+from . import bulk, emails, events, export, outbox, rollups, streams
 from cart.models import Cart
 import logging
 
@@ -26,20 +35,103 @@ class OrderViewSet(viewsets.ModelViewSet):
     search_fields = ['order_number', 'phone']
     ordering_fields = ['created_at', 'total_amount', 'status']
 
+    @property
+    def summary_mode(self):
+        # ?view=summary lists from the denormalized columns on orders only
+        return (
+            self.action in ('list', 'my_orders')
+            and self.request.query_params.get('view') == 'summary'
+        )
+
+    @property
+    def include_archived(self):
+        # ?include_archived=true also reads orders moved to orders_archive
+        return self.request.query_params.get('include_archived') == 'true'
+
+    def get_serializer_class(self):
+        if self.summary_mode:
+            return OrderSummarySerializer
+        return OrderSerializer
+
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Order.objects.none()
+        
         user = self.request.user
-        queryset = Order.objects.select_related('user').prefetch_related('items__product')
+        
+        if self.summary_mode:
+            queryset = Order.objects.only(*Order.SUMMARY_FIELDS)
+        else:
+            queryset = Order.objects.select_related('user').prefetch_related('items__product')
         
         if user.role == 'owner':
             return queryset.all()
         
         return queryset.filter(user=user)
 
+    def history_queryset(self, own_only=False):
+        """
+        Hot and archived orders as one ``values()`` listing, newest first.
+        Filtering backends cannot run on a UNION, so only ``status`` is supported.
+        """
+        user = self.request.user
+        fields = ('id', 'order_number', 'status', 'total_amount', 'item_count', 
+                  'thumbnail', 'created_at')
+        hot = Order.objects.all()
+        archived = ArchivedOrder.objects.all()
+        
+        if own_only or user.role != 'owner':
+            hot = hot.filter(user=user)
+            archived = archived.filter(user=user)
+        
+        order_status = self.request.query_params.get('status')
+        if order_status:
+            hot = hot.filter(status=order_status)
+            archived = archived.filter(status=order_status)
+        
+        hot = hot.order_by().values(*fields).annotate(
+            archived=Value(False, output_field=BooleanField())
+        )
+        archived = archived.order_by().values(*fields).annotate(
+            archived=Value(True, output_field=BooleanField())
+        )
+        return hot.union(archived, all=True).order_by('-created_at')
+
+    def history_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        
+        if page is not None:
+            serializer = OrderHistorySerializer(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = OrderHistorySerializer(queryset, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        if self.include_archived:
+            return self.history_response(self.history_queryset())
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not self.include_archived:
+                raise
+        
+        archived = ArchivedOrder.objects.select_related('user').prefetch_related('items')
+        if request.user.role != 'owner':
+            archived = archived.filter(user=request.user)
+        
+        order = get_object_or_404(archived, pk=kwargs['pk'])
+        return Response(ArchivedOrderSerializer(order, context=self.get_serializer_context()).data)
+
     def get_throttles(self):
         if self.action == 'create':
             return [OrderThrottle()]
         return super().get_throttles()
 
+    @idempotent
     @transaction.atomic
     def create(self, request):
         serializer = CreateOrderSerializer(data=request.data)
@@ -79,6 +171,11 @@ class OrderViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
+        # First product image doubles as the order thumbnail in summary listings
+        thumbnail = next(
+            (item.product.image.name for item in cart.items.all() if item.product.image), ''
+        )
+        
         # Create order
         order = Order.objects.create(
             user=request.user,
@@ -87,6 +184,8 @@ class OrderViewSet(viewsets.ModelViewSet):
             shipping_address=serializer.validated_data['shipping_address'],
             phone=serializer.validated_data['phone'],
             notes=serializer.validated_data.get('notes', ''),
+            item_count=cart.total_items,
+            thumbnail=thumbnail,
         )
         
         # Create order items and update stock
@@ -107,8 +206,16 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Clear cart
         cart.items.all().delete()
         
-        # Send confirmation email asynchronously
-        send_order_confirmation_email.delay(order.id)
+        rollups.order_created(order.id)
+        
+        # Send confirmation email once the order is committed
+        outbox.enqueue(
+            send_order_emails, [emails.confirmation(order.id)],
+            dedup_key=f'order_confirmation_{order.id}'
+        )
+        events.publish_on_commit([
+            events.order_event('order_created', order.id, order.order_number, order.user_id, order.status)
+        ])
         
         logger.info(f"Order created: #{order.order_number} by {request.user.username}")
         
@@ -135,18 +242,32 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        old_status = order.get_status_display()
         new_status_value = serializer.validated_data['status']
         
-        order.status = new_status_value
-        order.save(update_fields=['status', 'updated_at'])
-        
-        # Send status update email
-        send_order_status_update_email.delay(
-            order.id, 
-            old_status, 
-            order.get_status_display()
-        )
+        with transaction.atomic():
+            # The status being left is read under a row lock, so a concurrent
+            # update cannot move the rollups from the wrong row. Unlike
+            # bulk_update_status, any move is allowed here, as in the admin,
+            # so owners can correct a delivered or cancelled order.
+            order.status = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+            old_status = order.get_status_display()
+            old_status_value = order.status
+            
+            order.status = new_status_value
+            order.save(update_fields=['status', 'updated_at'])
+            rollups.status_changed(order.id, old_status_value, new_status_value)
+            
+            # Send status update email once the change is committed
+            outbox.enqueue(
+                send_order_emails,
+                [emails.status_update(order.id, old_status, order.get_status_display())]
+            )
+            events.publish_on_commit([
+                events.order_event(
+                    'order_status', order.id, order.order_number, order.user_id,
+                    new_status_value, old_status_value
+                )
+            ])
         
         logger.info(f"Order status updated: #{order.order_number} from {old_status} to {order.get_status_display()} by {request.user.username}")
         
@@ -156,8 +277,50 @@ class OrderViewSet(viewsets.ModelViewSet):
             'order': OrderSerializer(order).data
         })
 
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        if request.user.role != 'owner':
+            return Response(
+                {'error': True, 'message': 'Only owners can update order status'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = BulkUpdateOrderStatusSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': True, 'message': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = bulk.bulk_update_status(
+            serializer.validated_data['order_ids'],
+            serializer.validated_data['status']
+        )
+        updated = sum(1 for result in results if result['result'] == bulk.UPDATED)
+        
+        logger.info(f"Bulk status update to {serializer.validated_data['status']}: {updated} orders by {request.user.username}")
+        
+        return Response({
+            'success': True,
+            'message': f'{updated} orders updated',
+            'updated': updated,
+            'results': results
+        })
+
+    @action(detail=False, methods=['post'], url_path='events/ticket')
+    def events_ticket(self, request):
+        """Ticket for opening the order event stream from a browser (see streams.issue_ticket)."""
+        return Response({
+            'ticket': streams.issue_ticket(request.user.pk),
+            'expires_in': settings.ORDER_EVENTS_TICKET_TTL
+        })
+
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
+        if self.include_archived:
+            return self.history_response(self.history_queryset(own_only=True))
+        
         orders = self.get_queryset().filter(user=request.user)
         page = self.paginate_queryset(orders)
         
@@ -166,4 +329,53 @@ class OrderViewSet(viewsets.ModelViewSet):
             return self.get_paginated_response(serializer.data)
         
         serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        if request.user.role != 'owner':
+            return Response(
+                {'error': True, 'message': 'Only owners can view the sales dashboard'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = SalesDashboardQuerySerializer(data=request.query_params)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': True, 'message': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(rollups.dashboard(**serializer.validated_data))
+
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        if request.user.role != 'owner':
+            return Response(
+                {'error': True, 'message': 'Only owners can export orders'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        serializer = OrderExportQuerySerializer(data=request.query_params)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': True, 'message': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        params = serializer.validated_data
+        rows = export.export_rows(params.get('start'), params.get('end'), params.get('status'))
+        
+        response = StreamingHttpResponse(
+            export.render(rows, params['output']),
+            content_type=export.FORMATS[params['output']]
+        )
+        filename = f"orders-{timezone.now():%Y%m%d-%H%M%S}.{params['output']}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        
+        logger.info(f"Order export started ({params['output']}) by {request.user.username}")
+        
+        return response
@@ -0,0 +1,112 @@
+"""
+Async, read-only catalog endpoints for the ASGI process.
+
+They serve what ``ProductViewSet`` and ``CategoryViewSet`` return for the
+same request, reusing the viewsets' querysets, filter backends, paginator
+and serializers, but use Django's async ORM and cache API wherever those
+don't query the database by themselves, so one uvicorn worker keeps
+serving other connections while a request waits on the database or the
+cache.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+from rest_framework import exceptions
+from ecommerce_backend.async_api import async_api_view, response as json_response
+from ecommerce_backend.compression import cache_compressed
+from .models import Product
+from .serializers import CategorySerializer, product_count_key, product_counts
+from .views import CategoryViewSet, ProductViewSet
+
+
+async def category_product_counts(category_ids):
+    """Active products per category, through CategorySerializer's cache."""
+    keys = {product_count_key(category_id): category_id for category_id in category_ids}
+
+    def count(missing):
+        counts = dict.fromkeys(missing, 0)
+        rows = (
+            Product.objects.filter(category_id__in=[keys[key] for key in missing], is_active=True)
+            .values('category_id').annotate(count=Count('id')).order_by()
+        )
+        for row in rows:
+            counts[product_count_key(row['category_id'])] = row['count']
+        return counts
+
+    cached = await product_counts.aget_or_compute_many(list(keys), count)
+    return {keys[key]: value for key, value in cached.items()}
+
+
+def response(data):
+    # The same for every reader of the page, so compressed once (see CompressionMiddleware)
+    return cache_compressed(json_response(data), 'catalog')
+
+
+def viewset(viewset_class, request, action):
+    """``viewset_class`` set up the way its router would for ``action``."""
+    return viewset_class(request=request, args=(), kwargs={}, format_kwarg=None, action=action)
+
+
+@sync_to_async
+def page_of(view, queryset, filter=True):
+    """
+    The page ``view``'s list action would return. DjangoFilterBackend
+    validates choices and the paginator counts rows, so this runs in a thread.
+    """
+    if filter:
+        queryset = view.filter_queryset(queryset)
+    return view.paginate_queryset(queryset)
+
+
+async def product_page(request, featured=False):
+    view = viewset(ProductViewSet, request, 'featured' if featured else 'list')
+    if featured:
+        # Like ProductViewSet.featured, which skips the filter backends
+        page = await page_of(view, view.get_queryset().filter(featured=True), filter=False)
+    else:
+        page = await page_of(view, view.get_queryset())
+    return response(view.get_paginated_response(view.get_serializer(page, many=True).data).data)
+
+
+async def get_object(view, slug):
+    queryset = view.get_queryset()
+    try:
+        return await queryset.aget(slug=slug)
+    except queryset.model.DoesNotExist:
+        raise exceptions.NotFound(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+@async_api_view(methods=('GET',))
+async def product_list(request):
+    return await product_page(request)
+
+
+@async_api_view(methods=('GET',))
+async def featured_products(request):
+    return await product_page(request, featured=True)
+
+
+@async_api_view(methods=('GET',))
+async def product_detail(request, slug):
+    view = viewset(ProductViewSet, request, 'retrieve')
+    product = await get_object(view, slug)
+
+    context = {**view.get_serializer_context(), 'product_counts': await category_product_counts([product.category_id])}
+    return response(view.get_serializer_class()(product, context=context).data)
+
+
+@async_api_view(methods=('GET',))
+async def category_list(request):
+    view = viewset(CategoryViewSet, request, 'list')
+    page = await page_of(view, view.get_queryset())
+
+    context = {**view.get_serializer_context(), 'product_counts': await category_product_counts([c.id for c in page])}
+    return response(view.get_paginated_response(CategorySerializer(page, many=True, context=context).data).data)
+
+
+@async_api_view(methods=('GET',))
+async def category_detail(request, slug):
+    view = viewset(CategoryViewSet, request, 'retrieve')
+    category = await get_object(view, slug)
+
+    context = {**view.get_serializer_context(), 'product_counts': await category_product_counts([category.id])}
+    return response(CategorySerializer(category, context=context).data)
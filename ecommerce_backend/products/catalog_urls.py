@@ -0,0 +1,11 @@
+from django.urls import path
+from .async_views import category_detail, category_list, featured_products, product_detail, product_list
+
+# Served from the ASGI process; the same data as /api/products/ for the same request
+urlpatterns = [
+    path('products/', product_list, name='catalog_products'),
+    path('products/featured/', featured_products, name='catalog_featured'),
+    path('products/<slug:slug>/', product_detail, name='catalog_product'),
+    path('categories/', category_list, name='catalog_categories'),
+    path('categories/<slug:slug>/', category_detail, name='catalog_category'),
+]
@@ -1,6 +1,16 @@
 from rest_framework import serializers
+from ecommerce_backend.tiered_cache import TieredCache
 from .models import Category, Product
-from django.core.cache import cache
+
+PRODUCT_COUNT_TTL = 300
+
+# Active products per category, shared by the sync and async catalog views
+product_counts = TieredCache('category_product_count', PRODUCT_COUNT_TTL)
+
+
+def product_count_key(category_id):
+    return f'category_{category_id}_product_count'
+
 
 class CategorySerializer(serializers.ModelSerializer):
     product_count = serializers.SerializerMethodField()
@@ -11,14 +21,13 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ('slug', 'created_at', 'updated_at')
 
     def get_product_count(self, obj):
-        cache_key = f'category_{obj.id}_product_count'
-        count = cache.get(cache_key)
-        
-        if count is None:
-            count = obj.products.filter(is_active=True).count()
-            cache.set(cache_key, count, 300)  # Cache for 5 minutes
+        # Async views look the counts up beforehand (see products.async_views)
+        if 'product_counts' in self.context:
+            return self.context['product_counts'].get(obj.id, 0)
         
-        return count
+        return product_counts.get_or_compute(
+            product_count_key(obj.id), lambda: obj.products.filter(is_active=True).count()
+        )
 
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -1,3 +1,228 @@
-from django.test import TestCase
+import gzip
+import threading
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from accounts.models import User
+from ecommerce_backend import compression, tiered_cache
+from ecommerce_backend.tiered_cache import TieredCache, computing_key
+from .models import Category, Product
 
-# Create your tests here.
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+tiered = TieredCache('test_tiered', 60)
+
+
+@override_settings(
+    CACHES=LOCAL_CACHES,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class ProductsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'password', role='owner')
+        self.books = Category.objects.create(name='Books', description='Paper and ink')
+        self.games = Category.objects.create(name='Games')
+        self.novel = self.create_product(self.books, 'Novel', '10.00', stock=5, featured=True)
+        self.atlas = self.create_product(self.books, 'Atlas', '30.00', stock=0)
+        self.chess = self.create_product(self.games, 'Chess', '20.00', stock=2, description='A novel opening')
+        self.create_product(self.games, 'Retired', '5.00', is_active=False)
+
+    def create_product(self, category, name, price, **fields):
+        fields.setdefault('description', name)
+        return Product.objects.create(category=category, name=name, price=price, created_by=self.owner, **fields)
+
+
+class AsyncCatalogTests(ProductsTestCase):
+    queries = [
+        {},
+        {'search': 'novel'},
+        {'ordering': '-price'},
+        {'ordering': 'stock,name'},
+        {'category': '1', 'ordering': 'name'},
+        {'featured': 'true'},
+        {'min_price': '15', 'max_price': '25'},
+        {'in_stock': 'true', 'ordering': 'price'},
+    ]
+
+    def assertSameResponse(self, catalog_url, api_url, params=None):
+        expected = APIClient().get(api_url, params)
+        response = self.client.get(catalog_url, params)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    def test_product_list_matches_the_viewset(self):
+        for params in self.queries:
+            with self.subTest(params=params):
+                self.assertSameResponse('/api/catalog/products/', '/api/products/', params)
+
+    def test_invalid_filters_are_rejected_like_the_viewset(self):
+        for params in [{'category': '999'}, {'min_price': 'cheap'}, {'page': '9'}]:
+            with self.subTest(params=params):
+                response = self.assertSameResponse('/api/catalog/products/', '/api/products/', params)
+                self.assertIn(response.status_code, (400, 404))
+
+    def test_featured_and_detail_match_the_viewset(self):
+        self.assertSameResponse('/api/catalog/products/featured/', '/api/products/featured/')
+        self.assertSameResponse(f'/api/catalog/products/{self.novel.slug}/', f'/api/products/{self.novel.slug}/')
+        self.assertEqual(self.client.get('/api/catalog/products/retired/').status_code, 404)
+
+    def test_categories_match_the_viewset(self):
+        for params in [{}, {'search': 'ink'}, {'ordering': '-name'}]:
+            with self.subTest(params=params):
+                self.assertSameResponse('/api/catalog/categories/', '/api/products/categories/', params)
+        self.assertSameResponse(f'/api/catalog/categories/{self.games.slug}/', f'/api/products/categories/{self.games.slug}/')
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.forget_all()
+        # As with Redis and a connected subscriber, without either
+        patches = [
+            mock.patch.object(tiered_cache, 'uses_redis', return_value=True),
+            mock.patch.object(tiered_cache.invalidations, 'ensure_started'),
+            mock.patch.object(tiered_cache.invalidations, 'connected', True),
+            mock.patch.object(tiered_cache.invalidations, 'publish'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.publish = tiered_cache.invalidations.publish
+
+    def test_changes_are_announced_and_fills_are_not(self):
+        tiered.fill('key', 'value', tiered.generation)
+        tiered.get_or_compute('computed', lambda: 'value')
+        self.publish.assert_not_called()
+
+        tiered.set('key', 'changed')
+        tiered.delete('key')
+        self.assertEqual(self.publish.call_count, 2)
+
+    def test_fill_after_an_invalidation_stays_out_of_l1(self):
+        generation = tiered.generation
+        tiered.delete('key')  # Arrives while the value is being loaded
+        tiered.fill('key', 'old', generation)
+
+        self.assertIsNone(tiered.local.get('key'))
+        self.assertEqual(cache.get('key'), 'old')
+
+    def test_announced_keys_are_dropped_from_l1(self):
+        tiered.set('key', 'value')
+        self.assertEqual(tiered.local.get('key'), 'value')
+
+        tiered_cache.invalidations._apply({'origin': 'another-process', 'cache': tiered.name, 'keys': ['key']})
+
+        self.assertIsNone(tiered.local.get('key'))
+        self.assertEqual(tiered.get('key'), 'value')
+
+
+@override_settings(CACHES=LOCAL_CACHES, CACHE_COMPUTE_WAIT_TIMEOUT=2)
+class StampedeProtectionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.forget_all()
+        self.calls = 0
+
+    def compute(self, value='value', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_concurrent_misses_compute_once(self):
+        results = []
+        compute = self.compute(delay=0.2)
+
+        def request():
+            results.append(tiered.get_or_compute('key', compute))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_served_while_it_is_refreshed(self):
+        cache.set('key', ('old', 0.0, time.time() - 1), 60)
+
+        self.assertEqual(tiered.get_or_compute('key', self.compute('new', delay=0.1)), 'old')
+
+        self.assertTrue(self.wait_for(lambda: cache.get('key')[0] == 'new'))
+        self.assertTrue(self.wait_for(lambda: computing_key('key') not in cache))
+        self.assertEqual(tiered.get_or_compute('key', self.compute('newer')), 'new')
+        self.assertEqual(self.calls, 1)
+
+    def test_waiter_computes_when_the_lock_holder_fails(self):
+        cache.add(computing_key('key'), 'another-process', 30)
+        # The other process releases its lock without storing a value
+        failure = threading.Timer(0.1, cache.delete, args=(computing_key('key'),))
+        failure.start()
+
+        self.assertEqual(tiered.get_or_compute('key', self.compute()), 'value')
+        failure.join()
+        self.assertEqual(self.calls, 1)
+
+    def test_failed_computation_releases_the_lock(self):
+        def fail():
+            raise RuntimeError('database unavailable')
+
+        with self.assertRaises(RuntimeError):
+            tiered.get_or_compute('key', fail)
+
+        self.assertNotIn(computing_key('key'), cache)
+        self.assertEqual(tiered.get_or_compute('key', self.compute()), 'value')
+
+
+@override_settings(COMPRESSION_MIN_SIZE=0)
+class CompressedCatalogTests(ProductsTestCase):
+    def setUp(self):
+        super().setUp()
+        compression.variants.forget_all()
+        self.compressions = 0
+        gzip_coding = compression.CODINGS['gzip']
+
+        def counting_gzip(data):
+            self.compressions += 1
+            return gzip_coding(data)
+
+        patch = mock.patch.dict(compression.CODINGS, {'gzip': counting_gzip})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def get(self, url):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+
+    def test_catalog_pages_are_compressed_once(self):
+        for url in ['/api/catalog/products/', '/api/products/']:
+            with self.subTest(url=url):
+                self.compressions = 0
+                first, again = self.get(url), self.get(url)
+
+                self.assertEqual(first['Content-Encoding'], 'gzip')
+                self.assertEqual(again.content, first.content)
+                self.assertEqual(self.compressions, 1)
+
+    def test_changed_page_is_compressed_again(self):
+        first = self.get('/api/catalog/products/')
+        Product.objects.filter(pk=self.novel.pk).update(stock=50)
+        changed = self.get('/api/catalog/products/')
+
+        self.assertEqual(self.compressions, 2)
+        self.assertIn(b'"stock":50', gzip.decompress(changed.content).replace(b' ', b''))
+        self.assertNotEqual(changed.content, first.content)
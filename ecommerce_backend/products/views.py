@@ -1,17 +1,43 @@
+from decimal import Decimal, InvalidOperation
 from rest_framework import viewsets, filters, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from django_filters.rest_framework import DjangoFilterBackend
-from django.core.cache import cache
+from ecommerce_backend.compression import cache_compressed
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductSerializer, ProductDetailSerializer
+from .serializers import (
+    CategorySerializer, ProductSerializer, ProductDetailSerializer, product_count_key, product_counts
+)
 from .permissions import IsOwnerOrReadOnly
 import logging
 
 logger = logging.getLogger(__name__)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+
+def price_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        price = None
+    if price is None or not price.is_finite():
+        raise ValidationError({name: 'A valid number is required.'})
+    return price
+
+class CompressedReadsMixin:
+    """Catalog pages are the same for many readers, so their compressed bodies are cached."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code == status.HTTP_200_OK:
+            cache_compressed(response, 'catalog')
+        return response
+
+class CategoryViewSet(CompressedReadsMixin, viewsets.ModelViewSet):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
@@ -33,10 +59,10 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         category = serializer.save()
         # Invalidate cache
-        cache.delete(f'category_{category.id}_product_count')
+        product_counts.delete(product_count_key(category.id))
         logger.info(f"Category updated: {category.name} by {self.request.user.username}")
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CompressedReadsMixin, viewsets.ModelViewSet):
     queryset = Product.objects.filter(is_active=True).select_related('category', 'created_by')
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     lookup_field = 'slug'
@@ -57,13 +83,13 @@ class ProductViewSet(viewsets.ModelViewSet):
             queryset = Product.objects.all().select_related('category', 'created_by')
         
         # Additional filters
-        min_price = self.request.query_params.get('min_price')
-        max_price = self.request.query_params.get('max_price')
+        min_price = price_param(self.request, 'min_price')
+        max_price = price_param(self.request, 'max_price')
         in_stock = self.request.query_params.get('in_stock')
         
-        if min_price:
+        if min_price is not None:
             queryset = queryset.filter(price__gte=min_price)
-        if max_price:
+        if max_price is not None:
             queryset = queryset.filter(price__lte=max_price)
         if in_stock == 'true':
             queryset = queryset.filter(stock__gt=0)
@@ -73,19 +99,19 @@ class ProductViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         product = serializer.save(created_by=self.request.user)
         # Invalidate category cache
-        cache.delete(f'category_{product.category.id}_product_count')
+        product_counts.delete(product_count_key(product.category.id))
         logger.info(f"Product created: {product.name} by {self.request.user.username}")
 
     def perform_update(self, serializer):
         product = serializer.save()
-        cache.delete(f'category_{product.category.id}_product_count')
+        product_counts.delete(product_count_key(product.category.id))
         logger.info(f"Product updated: {product.name} by {self.request.user.username}")
 
     def perform_destroy(self, instance):
         # Soft delete
         instance.is_active = False
         instance.save()
-        cache.delete(f'category_{instance.category.id}_product_count')
+        product_counts.delete(product_count_key(instance.category.id))
         logger.info(f"Product deleted: {instance.name} by {self.request.user.username}")
 
     @action(detail=False, methods=['get'])